@@ -7,13 +7,21 @@ interface, but cannot be automatically assessed for correctness.
 STUDENTS SHOULD NOT NEED TO MODIFY THIS CODE.  IT WOULD BE BEST TO TREAT THIS
 FILE AS A BLACK BOX FOR TESTING.
 """
+import functools
+import os
 import random
+import tempfile
 import unittest
 import timeit
 import sys
+import time
 
 import isolation
 import game_agent
+import sample_players
+import mcts
+import perft
+import solver
 
 from collections import Counter
 from copy import deepcopy
@@ -536,5 +544,870 @@ class Project1Test(unittest.TestCase):
                 legal_moves, chosen_move))
 
 
+class BoardTest(unittest.TestCase):
+    """Tests for the alternative board implementations, which must agree with
+    `isolation.Board` on every position.
+    """
+
+    @timeout(10)
+    def test_mobility_board(self):
+        """ Test MobilityBoard keeps mobility counts through apply and undo """
+        rng = random.Random(0)
+        for w, h in [(5, 5), (7, 7), (8, 6)]:
+            board = isolation.MobilityBoard("p1", "p2", w, h)
+            history = []
+            copies = []
+            while True:
+                for player in ("p1", "p2"):
+                    self.assertEqual(board.mobility(player),
+                                     len(board.get_legal_moves(player)))
+                self.assertEqual(board.get_blank_spaces(),
+                                 isolation.Board.get_blank_spaces(board))
+                self.assertEqual(board.position_key(),
+                                 isolation.Board.position_key(board))
+                moves = board.get_legal_moves()
+                if not moves:
+                    break
+                history.append((board.to_string(), board.position_key()))
+                board.apply_move(rng.choice(moves))
+                if rng.random() < 0.2:
+                    copies.append((board.copy(), len(history)))
+                if rng.random() < 0.2:
+                    # take the move back, check the position, and replay it
+                    move = board.get_player_location(board.inactive_player)
+                    board.undo_move()
+                    self.assertEqual(history[-1], (board.to_string(), board.position_key()))
+                    board.apply_move(move)
+
+            # copies are unaffected by later moves and can be unwound
+            for copied, plies in copies:
+                for _ in range(plies):
+                    copied.undo_move()
+                    plies -= 1
+                    self.assertEqual(history[plies], (copied.to_string(), copied.position_key()))
+                    self.assertEqual(copied.mobility(), len(copied.get_legal_moves()))
+
+            while history:
+                board.undo_move()
+                self.assertEqual(history.pop(), (board.to_string(), board.position_key()))
+
+    @timeout(10)
+    def test_compact_board(self):
+        """ Test CompactBoard agrees with Board through random games """
+        rng = random.Random(2)
+        for w, h in [(5, 5), (7, 7), (8, 6)]:
+            board = isolation.Board("p1", "p2", w, h)
+            compact = isolation.CompactBoard("p1", "p2", w, h)
+            while True:
+                self.assertEqual(board.to_string(), compact.to_string())
+                self.assertEqual(board.position_key(), compact.position_key())
+                self.assertEqual(board.get_blank_spaces(), compact.get_blank_spaces())
+                for player in ("p1", "p2"):
+                    self.assertEqual(board.get_legal_moves(player),
+                                     compact.get_legal_moves(player))
+                    self.assertEqual(board.mobility(player), compact.mobility(player))
+                    self.assertEqual(board.get_player_location(player),
+                                     compact.get_player_location(player))
+                    self.assertEqual(board.utility(player), compact.utility(player))
+                moves = board.get_legal_moves()
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                self.assertEqual(board.forecast_move(move).position_key(),
+                                 compact.forecast_move(move).position_key())
+                board.apply_move(move)
+                compact.apply_move(move)
+            self.assertEqual(compact.active_player, board.active_player)
+
+        # full games through the shared game loop, including pondering players
+        for players in [(sample_players.RandomPlayer(), sample_players.RandomPlayer()),
+                        (game_agent.CustomPlayer(method='alphabeta', ponder=True),
+                         sample_players.GreedyPlayer())]:
+            compact = isolation.CompactBoard(players[0], players[1], 5, 5)
+            winner, history, termination = compact.play(time_limit=50)
+            self.assertIn(winner, players)
+            self.assertEqual(termination, "illegal move")
+            self.assertEqual(compact.get_legal_moves(), [])
+            self.assertIsNone(getattr(players[0], "_ponder_thread", None))
+
+    @timeout(5)
+    def test_move_encoding(self):
+        """ Test moves round-trip through their cell index encoding """
+        for w, h in [(7, 7), (8, 5)]:
+            board = isolation.Board("p1", "p2", w, h)
+            for move in board.get_blank_spaces():
+                self.assertEqual(isolation.decode_move(isolation.encode_move(move, w), w), move)
+            self.assertEqual(isolation.encode_move(isolation.Board.NOT_MOVED, w), -1)
+            self.assertIsNone(isolation.decode_move(-1, w))
+            board.apply_move((2, 3))
+            self.assertEqual(board.position_key(), (1 << (2 * w + 3), 2 * w + 3, -1))
+
+    @timeout(10)
+    def test_serialization(self):
+        """ Test boards round-trip through their binary encoding """
+        rng = random.Random(6)
+        classes = (isolation.Board, isolation.MobilityBoard, isolation.CompactBoard)
+        for w, h in [(7, 7), (5, 6)]:
+            boards = []
+            for plies in range(0, 12, 3):
+                board = isolation.Board("p1", "p2", w, h)
+                for _ in range(plies):
+                    moves = board.get_legal_moves()
+                    if moves:
+                        board.apply_move(rng.choice(moves))
+                boards.append(board)
+
+            for board in boards:
+                data = board.to_bytes()
+                self.assertEqual(len(data), 9 + (w * h + 7) // 8)
+                for cls in classes:
+                    decoded = cls.from_bytes(data, "p1", "p2")
+                    self.assertEqual(decoded.to_bytes(), data)
+                    self.assertEqual(decoded.to_string(), board.to_string())
+                    self.assertEqual(decoded.active_player, board.active_player)
+                    self.assertEqual(decoded.move_count, board.move_count)
+                    for player in ("p1", "p2"):
+                        self.assertEqual(decoded.get_legal_moves(player),
+                                         board.get_legal_moves(player))
+                        self.assertEqual(decoded.mobility(player), board.mobility(player))
+                    self.assertEqual(decoded.get_blank_spaces(), board.get_blank_spaces())
+                    self.assertEqual(decoded.position_key(), board.position_key())
+
+            for cls in classes:
+                decoded = cls.batch_from_bytes(isolation.Board.batch_to_bytes(boards), "p1", "p2")
+                self.assertEqual([b.position_key() for b in decoded],
+                                 [b.position_key() for b in boards])
+
+    @timeout(10)
+    def test_perft(self):
+        """ Test perft counts agree across board classes and options """
+        board = isolation.Board("p1", "p2", 5, 5)
+        self.assertEqual(perft.perft(board, 1), 25)
+        self.assertEqual(perft.perft(board, 2), 25 * 24)
+        rng = random.Random(3)
+        for plies in range(4):
+            moves = []
+            board = isolation.Board("p1", "p2", 6, 5)
+            for _ in range(plies):
+                moves.append(rng.choice(board.get_legal_moves()))
+                board.apply_move(moves[-1])
+            expected = perft.perft(board, 3)
+            for cls in (isolation.Board, isolation.MobilityBoard, isolation.CompactBoard):
+                other = cls("p1", "p2", 6, 5)
+                for move in moves:
+                    other.apply_move(move)
+                self.assertEqual(perft.perft(other, 3), expected)
+                self.assertEqual(perft.perft(other, 3, bulk=True, cache={}), expected)
+                self.assertEqual(sum(n for _, n in perft.divide(other, 3)), expected)
+
+    @timeout(10)
+    def test_solver(self):
+        """ Test the solver against exhaustive search on small boards """
+        def wins(game):
+            return any(not wins(game.forecast_move(m)) for m in game.get_legal_moves())
+
+        rng = random.Random(4)
+        for w, h in [(4, 4), (4, 3)]:
+            s = solver.Solver(w, h)
+            for _ in range(10):
+                board = isolation.Board("p1", "p2", w, h)
+                for _ in range(rng.randrange(1, 5)):
+                    moves = board.get_legal_moves()
+                    if moves:
+                        board.apply_move(rng.choice(moves))
+                self.assertEqual(s.solve(board), wins(board))
+
+        # a player consulting the table only plays moves that keep the win
+        table = {(4, 4): solver.build_table(4, 4, plies=3)}
+        player = game_agent.CustomPlayer(opening_table=table)
+        s = solver.Solver(4, 4)
+        for opening in solver.openings(4, 4, 2):
+            if s.solve(opening):
+                move = player._solved_move(opening, opening.get_legal_moves())
+                self.assertIn(move, s.winning_moves(opening))
+
+    @timeout(10)
+    def test_reachable(self):
+        """ Test the bitmask flood fill against a breadth-first search """
+        from isolation.bitboard import knight_tables, reachable, popcount
+        rng = random.Random(1)
+        for w, h in [(5, 5), (7, 7), (9, 6)]:
+            tables = knight_tables(w, h)
+            for _ in range(20):
+                blank = rng.getrandbits(w * h) & tables.full
+                start = rng.randrange(w * h)
+                for max_depth in (1, 2, 3, None):
+                    seen, frontier, depth = set(), {start}, 0
+                    while frontier and (max_depth is None or depth < max_depth):
+                        frontier = set(n for cell in frontier
+                                       for n in isolation.isolation.knight_neighbors(w, h)[cell]
+                                       if blank >> n & 1 and n not in seen)
+                        seen |= frontier
+                        depth += 1
+                    mask = reachable(tables, start, blank, max_depth)
+                    self.assertEqual(popcount(mask), len(seen))
+                    self.assertEqual(mask, sum(1 << n for n in seen))
+
+
+    @timeout(10)
+    def test_batch_board(self):
+        """ Test the lockstep batched engine against isolation.Board """
+        from isolation.batch import BatchBoard, random_policy, greedy_policy, \
+            two_ply_policy, rollout_policy
+        from isolation.vectorized import batch_mobility
+        w, h = 5, 6
+        batch = BatchBoard(30, w, h)
+        policies = [random_policy, greedy_policy(), two_ply_policy(), rollout_policy(2)]
+        winner = batch.play(policies[0], policies[1], rng=0)
+        self.assertFalse(batch.active.any())
+        for i in range(batch.count):
+            board = isolation.Board("p1", "p2", w, h)
+            for cell in batch.history[i, :batch.move_count[i]]:
+                move = isolation.decode_move(int(cell), w)
+                self.assertIn(move, board.get_legal_moves())
+                board.apply_move(move)
+            self.assertEqual(board.get_legal_moves(), [])
+            self.assertEqual(["p1", "p2"][winner[i]], board.inactive_player)
+            self.assertEqual(batch.take([i]).to_bytes(), board.to_bytes())
+
+        # positions loaded part way through games agree on moves and mobility
+        rng = random.Random(2)
+        boards = [isolation.Board("p1", "p2", w, h) for _ in range(20)]
+        for board in boards:
+            for _ in range(rng.randint(0, 12)):
+                moves = board.get_legal_moves()
+                if len(moves) > 1:
+                    board.apply_move(rng.choice(moves))
+        batch = BatchBoard.from_bytes(isolation.Board.batch_to_bytes(boards))
+        own, other = batch.mobility()
+        mover, opponent = batch.child_mobility()
+        for i, board in enumerate(boards):
+            moves = board.get_legal_moves()
+            cells = [isolation.encode_move(m, w) for m in moves]
+            self.assertEqual(sorted(cells), list(batch.legal[i].nonzero()[0]))
+            self.assertEqual(own[i], len(moves))
+            self.assertEqual(other[i], board.mobility(board.inactive_player))
+            if not moves:
+                self.assertEqual(batch.winner[i], batch.to_move[i] ^ 1)
+                continue
+            expected = batch_mobility(board, moves)
+            self.assertEqual(list(mover[i, cells]), list(expected[0]))
+            self.assertEqual(list(opponent[i, cells]), list(expected[1]))
+
+        winner = batch.take(list(range(batch.count))).play(policies[2], policies[3], rng=1)
+        self.assertTrue(((winner == 0) | (winner == 1)).all())
+        self.assertTrue(batch.active.any())
+        batch = BatchBoard(1, w, h)
+        batch.apply_moves([0])
+        with self.assertRaises(ValueError):
+            batch.apply_moves([0])
+
+
+class SearchExtensionsTest(unittest.TestCase):
+    """Tests for the optional search features of CustomPlayer, which must not
+    change the behavior verified by Project1Test when they are disabled.
+    """
+
+    @timeout(5)
+    def test_time_manager(self):
+        """ Test TimeManager predicts iteration costs and declines iterations
+        that don't fit """
+        clock = [1000.]
+        time_left = lambda: clock[0]
+        manager = game_agent.TimeManager(stable_margin=1.0, unstable_margin=1.5,
+                                         stable_iterations=2, default_ebf=5., max_ebf=8.)
+        manager.start(time_left)
+        self.assertEqual(manager.predicted_cost(), 0.)
+        clock[0] = 990.
+        self.assertEqual(manager.record((0, 1), time_left), 990.)
+        self.assertEqual(manager.predicted_cost(), 50.)    # default_ebf
+        clock[0] = 970.
+        manager.record((0, 1), time_left)
+        self.assertEqual(manager.effective_branching_factor(), 2.)
+        clock[0] = 930.
+        manager.record((2, 2), time_left)
+        # two plies apart: sqrt(40 / 10)
+        self.assertEqual(manager.effective_branching_factor(), 2.)
+        self.assertEqual(manager.predicted_cost(), 80.)
+
+        # the best move just changed: up to 1.5x the remaining time is allowed
+        self.assertFalse(manager.is_stable())
+        self.assertTrue(manager.should_continue(75., 10.))
+        self.assertFalse(manager.should_continue(60., 10.))
+        clock[0] = 850.
+        manager.record((2, 2), time_left)
+        self.assertTrue(manager.is_stable())
+        cost = manager.predicted_cost()
+        self.assertTrue(manager.should_continue(cost + 10., 10.))
+        self.assertFalse(manager.should_continue(cost + 9., 10.))
+
+        # the measured branching factor is clamped to [1, max_ebf]
+        manager.start(time_left)
+        for remaining in (840., 740.):
+            clock[0] = remaining
+            manager.record((0, 1), time_left)
+        self.assertEqual(manager.effective_branching_factor(), 8.)
+        manager.start(time_left)
+        for remaining in (700., 690.):
+            clock[0] = remaining
+            manager.record((0, 1), time_left)
+        self.assertEqual(manager.effective_branching_factor(), 1.)
+
+        # iterative deepening stops when the next iteration isn't predicted
+        # to finish, even though time remains
+        agentUT = game_agent.CustomPlayer(
+            method='alphabeta', time_manager=game_agent.TimeManager(unstable_margin=1.0))
+        depths = []
+        search = agentUT.alphabeta
+        def alphabeta(game, depth, *args, **kwargs):
+            if game is not board:
+                return search(game, depth, *args, **kwargs)
+            depths.append(depth)
+            result = search(game, depth, *args, **kwargs)
+            clock[0] -= 100.
+            return result
+        agentUT.alphabeta = alphabeta
+        board = isolation.Board(agentUT, 'null_agent', 7, 7)
+        board.apply_move((3, 3))
+        board.apply_move((1, 1))
+        clock[0] = 1000.
+        agentUT.get_move(board, board.get_legal_moves(), time_left)
+        # each iteration takes 100ms, which is predicted for the next one
+        # once the branching factor is measured
+        self.assertEqual(depths, list(range(1, 10)))
+        self.assertEqual(clock[0], 100.)
+
+    @timeout(5)
+    def test_auto_poll_interval(self):
+        """ Test 'auto' polling adapts the interval to the node rate and the
+        time left, and still stops the search before the threshold """
+        clock = [1000.]
+        agentUT = game_agent.CustomPlayer(poll_interval='auto', timeout=10.)
+        agentUT.time_left = lambda: clock[0]
+
+        def poll(nodes, remaining):
+            agentUT.nodes_searched, clock[0] = nodes, remaining
+            agentUT._check_time()
+            return agentUT._next_poll - nodes
+
+        self.assertEqual(poll(0, 1000.), 1)
+        # the interval covers POLL_MILLIS at the measured node rate
+        self.assertEqual(poll(100, 999.), 100 * game_agent.POLL_MILLIS)
+        self.assertEqual(poll(1100, 998.), 1000 * game_agent.POLL_MILLIS)
+        # ... or half of the time left before the threshold, if less
+        poll(1200, 15.)
+        self.assertEqual(poll(1300, 14.), 200)
+        self.assertEqual(poll(1500, 12.), 100)
+        self.assertEqual(poll(1600, 11.), 50)
+        # a clock that hasn't advanced doubles the interval
+        self.assertEqual(poll(1650, 11.), 100)
+        self.assertEqual(poll(1750, 11.), 200)
+        with self.assertRaises(game_agent.Timeout):
+            poll(1800, 9.)
+
+        # a search running at 100 nodes/ms reads the clock a few hundred
+        # times and stops within one node of the threshold
+        agentUT.time_left = lambda: 1000. - agentUT.nodes_searched / 100.
+        agentUT.nodes_searched, agentUT._next_poll, agentUT._last_poll = 0, 0, None
+        reads = 0
+        with self.assertRaises(game_agent.Timeout):
+            while True:
+                agentUT.nodes_searched += 1
+                if agentUT.nodes_searched >= agentUT._next_poll:
+                    reads += 1
+                    agentUT._check_time()
+        self.assertTrue(reads < 1000)
+        self.assertTrue(agentUT.TIMER_THRESHOLD - 0.01 <= agentUT.time_left() < agentUT.TIMER_THRESHOLD)
+
+    @timeout(5)
+    def test_search_stats(self):
+        """ Test CustomPlayer records per-move statistics when enabled """
+        agentUT = game_agent.CustomPlayer(3, game_agent.custom_score, False,
+                                          "alphabeta", collect_stats=True)
+        board = isolation.Board(agentUT, 'null_agent', 7, 7)
+        board.apply_move((2, 3))
+        board.apply_move((0, 0))
+        legal_moves = board.get_legal_moves()
+        move = agentUT.get_move(board, legal_moves, lambda: 1e3)
+
+        self.assertIn(move, legal_moves)
+        self.assertEqual(len(agentUT.stats.games), 1)
+        record = agentUT.stats.games[-1][-1]
+        self.assertEqual(record["depth"], 3)
+        self.assertEqual(record["move"], move)
+        self.assertTrue(record["nodes"] > 0 and record["leaves"] > 0)
+
+        # a board with a lower move count starts a new game
+        board = isolation.Board(agentUT, 'null_agent', 7, 7)
+        agentUT.get_move(board, board.get_legal_moves(), lambda: 1e3)
+        self.assertEqual(len(agentUT.stats.games), 2)
+
+    @timeout(20)
+    def test_ponder(self):
+        """ Test pondered iterations are resumed only after the predicted
+        reply, and that pondering stops promptly """
+        def timer(time_limit):
+            deadline = curr_time_millis() + time_limit
+            return lambda: deadline - curr_time_millis()
+
+        def ponder(agentUT):
+            board = isolation.Board(agentUT, 'null_agent', 7, 7)
+            board.apply_move((3, 3))
+            board.apply_move((1, 1))
+            move = agentUT.get_move(board, board.get_legal_moves(), timer(30))
+            board.apply_move(move)
+            start = timeit.default_timer()
+            while agentUT._ponder_result is None or agentUT._ponder_result[1] < 3:
+                self.assertTrue(timeit.default_timer() - start < 5)
+                self.assertTrue(agentUT._ponder_thread.is_alive())
+                time.sleep(0.01)
+            start = timeit.default_timer()
+            agentUT.stop_pondering()
+            self.assertTrue(timeit.default_timer() - start < 0.5)
+            self.assertIsNone(agentUT._ponder_thread)
+            return board
+
+        def first_depth(agentUT, board):
+            depths = []
+            search = agentUT.alphabeta
+            def alphabeta(game, depth, *args, **kwargs):
+                depths.append(depth)
+                return search(game, depth, *args, **kwargs)
+            agentUT.alphabeta = alphabeta
+            polls = iter(range(500))
+            time_left = lambda: 100 if next(polls, None) is not None else 0
+            move = agentUT.get_move(board, board.get_legal_moves(), time_left)
+            agentUT.stop_pondering()
+            del agentUT.alphabeta
+            self.assertIn(move, board.get_legal_moves())
+            return depths[0]
+
+        agentUT = game_agent.CustomPlayer(method='alphabeta', ponder=True)
+        board = ponder(agentUT)
+        key, depth, _ = agentUT._ponder_result
+        replies = [m for m in board.get_legal_moves()
+                   if board.forecast_move(m).position_key() == key]
+        self.assertEqual(len(replies), 1)
+        predicted = board.forecast_move(replies[0])
+        self.assertEqual(first_depth(agentUT, predicted), depth + 1)
+
+        board = ponder(agentUT)
+        key = agentUT._ponder_result[0]
+        other = [m for m in board.get_legal_moves()
+                 if board.forecast_move(m).position_key() != key][0]
+        self.assertEqual(first_depth(agentUT, board.forecast_move(other)), 1)
+
+        # new_game() and the end of a game stop the background search
+        for stop in (lambda agentUT, board: agentUT.new_game(),
+                     lambda agentUT, board: isolation.isolation.stop_pondering(agentUT)):
+            board = isolation.Board(agentUT, 'null_agent', 7, 7)
+            agentUT.get_move(board, board.get_legal_moves(), timer(30))
+            self.assertTrue(agentUT._ponder_thread.is_alive())
+            stop(agentUT, board)
+            self.assertIsNone(agentUT._ponder_thread)
+        agents = [game_agent.CustomPlayer(method='alphabeta', ponder=True) for _ in range(2)]
+        board = isolation.Board(agents[0], agents[1], 5, 5)
+        board.play(time_limit=20)
+        self.assertEqual([a._ponder_thread for a in agents], [None, None])
+
+    @timeout(10)
+    def test_reuse_tree(self):
+        """ Test alphabeta with a transposition table finds the same value """
+        heuristic = game_agent.increase_own_moves_score
+        plain = game_agent.CustomPlayer(4, heuristic, False, "alphabeta")
+        reuse = game_agent.CustomPlayer(4, heuristic, False, "alphabeta",
+                                        reuse_tree=True)
+        for agentUT in (plain, reuse):
+            agentUT.time_left = lambda: 1e3
+
+        for loc1, loc2 in [((2, 3), (0, 0)), ((3, 3), (4, 5)), ((6, 6), (1, 4))]:
+            values = []
+            for agentUT in (plain, reuse):
+                board = isolation.Board(agentUT, 'null_agent', 7, 7)
+                board.apply_move(loc1)
+                board.apply_move(loc2)
+                values.append(agentUT.alphabeta(board, 4)[0])
+            self.assertEqual(values[0], values[1])
+            self.assertTrue(len(reuse.tt) > 0)
+
+        # cutoffs at both max and min nodes credit the history of the side
+        # that played the refuting move
+        self.assertEqual(set(side for side, _ in reuse.history), {True, False})
+        reuse.history = {}
+        move = (2, 1)
+        reuse._store("max fail-high", 3, 5., 0., 4., move, True)
+        reuse._store("min fail-low", 2, -1., 0., 4., move, False)
+        reuse._store("max fail-low", 2, -1., 0., 4., move, True)
+        reuse._store("min fail-high", 2, 5., 0., 4., move, False)
+        reuse._store("exact", 2, 1., 0., 4., move, True)
+        self.assertEqual(reuse.history, {(True, move): 9, (False, move): 4})
+
+        # positions that can't follow the last root start a new game
+        board = isolation.Board(reuse, 'null_agent', 7, 7)
+        reuse._root_key = (1, None, None)
+        reuse._rebase(board)
+        self.assertEqual(len(reuse.tt), 0)
+        self.assertEqual(reuse.history, {})
+
+    @timeout(10)
+    @unittest.skipIf(isolation.vectorized.np is None, "requires numpy")
+    def test_batch_scores(self):
+        """ Test batched score functions match the scalar implementations """
+        score_fns = [sample_players.null_score, sample_players.open_move_score,
+                     sample_players.improved_score, game_agent.custom_score,
+                     game_agent.square_move_diff,
+                     game_agent.increase_own_moves_score,
+                     game_agent.increase_opponent_move_penalty_near_endgame,
+                     game_agent.WeightedMobilityScore(),
+                     game_agent.WeightedMobilityScore(1.1, 1.1, 10)]
+        default_weights = game_agent.WeightedMobilityScore()
+        rng = random.Random(0)
+        for _ in range(50):
+            board = isolation.Board("p1", "p2", 7, 7)
+            for _ in range(rng.randint(0, 30)):
+                moves = board.get_legal_moves()
+                if not moves:
+                    break
+                board.apply_move(rng.choice(moves))
+            moves = board.get_legal_moves()
+            if not moves:
+                continue
+            for score_fn in score_fns:
+                for player in ("p1", "p2"):
+                    expected = [score_fn(board.forecast_move(m), player) for m in moves]
+                    self.assertEqual(score_fn.batch(board, moves, player), expected)
+                # the default weights reproduce custom_score
+                for position in [board] + [board.forecast_move(m) for m in moves]:
+                    self.assertEqual(default_weights(position, "p1"),
+                                     game_agent.custom_score(position, "p1"))
+
+    @timeout(10)
+    def test_eval_cache(self):
+        """ Test EvalCache returns cached scores and evicts old entries """
+        cache = game_agent.EvalCache(game_agent.custom_score, max_entries=3)
+        board = isolation.Board("p1", "p2", 7, 7)
+        board.apply_move((2, 3))
+        board.apply_move((0, 0))
+        children = [board.forecast_move(m) for m in board.get_legal_moves()]
+        for child in children[:4]:
+            self.assertEqual(cache(child, "p1"), game_agent.custom_score(child, "p1"))
+        self.assertEqual((cache.hits, cache.misses, len(cache.entries)), (0, 4, 3))
+
+        cache(children[3], "p1")
+        cache(children[3], "p2")
+        cache(children[0], "p1")
+        self.assertEqual((cache.hits, cache.misses), (1, 6))
+
+    @timeout(10)
+    @unittest.skipIf(isolation.vectorized.np is None, "requires numpy")
+    def test_eval_cache_batch(self):
+        """ Test the batched EvalCache scores only the uncached children """
+        rng = random.Random(3)
+        for symmetry_plies in (0, 4):
+            cache = game_agent.EvalCache(game_agent.custom_score, symmetry_plies=symmetry_plies)
+            for _ in range(10):
+                board = isolation.MobilityBoard("p1", "p2", 7, 7)
+                for _ in range(rng.randint(0, 20)):
+                    moves = board.get_legal_moves()
+                    if not moves:
+                        break
+                    board.apply_move(rng.choice(moves))
+                moves = board.get_legal_moves()
+                if not moves:
+                    continue
+                cache.clear()
+                children = [board.forecast_move(m) for m in moves]
+                cache(children[0], "p1")
+                expected = [game_agent.custom_score(child, "p1") for child in children]
+                self.assertEqual(cache.batch(board, moves, "p1"), expected)
+                self.assertEqual((cache.hits, cache.misses), (1, len(moves)))
+                # the batch stored the children under the keys of the scalar lookups
+                self.assertEqual([cache(child, "p1") for child in children], expected)
+                self.assertEqual(cache.hits, 1 + len(moves))
+
+        self.assertFalse(hasattr(game_agent.EvalCache(game_agent.reachable_area_score), "batch"))
+
+    @timeout(10)
+    def test_proven_results(self):
+        """ Test iterative deepening stops once the result is proven """
+        rng = random.Random(5)
+        checker = solver.Solver(5, 5)
+        for _ in range(10):
+            agentUT = game_agent.CustomPlayer(score_fn=game_agent.custom_score,
+                                              method="alphabeta", collect_stats=True)
+            board = isolation.Board(agentUT, "null_agent", 5, 5)
+            for _ in range(10):
+                moves = board.get_legal_moves()
+                if not moves:
+                    break
+                board.apply_move(rng.choice(moves))
+            legal_moves = board.get_legal_moves()
+            if not legal_moves:
+                continue
+            move = agentUT.get_move(board, legal_moves, lambda: 1e4)
+
+            # without the early stop the search would deepen to 98 plies
+            self.assertTrue(agentUT.stats.depth <= 25 - board.move_count)
+            if checker.solve(board):
+                self.assertIn(move, checker.winning_moves(board))
+            # the shortest win is preferred
+            immediate = [m for m in legal_moves
+                         if not board.forecast_move(m).get_legal_moves()]
+            if immediate:
+                self.assertIn(move, immediate)
+
+    @timeout(10)
+    def test_selective_search(self):
+        """ Test late move reductions and futility pruning are reported """
+        heuristic = game_agent.increase_own_moves_score
+        results = {}
+        null_windows = {}
+        for name, options in [("plain", {}), ("lmr", {"lmr": True}),
+                              ("eager", {"lmr": True, "lmr_full_moves": 1}),
+                              ("shallow", {"lmr": True, "lmr_min_depth": 6}),
+                              ("futility", {"futility_margin": 1.})]:
+            agentUT = game_agent.CustomPlayer(5, heuristic, False, "alphabeta",
+                                              collect_stats=True, **options)
+            board = isolation.Board(agentUT, "null_agent", 7, 7)
+            board.apply_move((2, 3))
+            board.apply_move((0, 0))
+            legal_moves = board.get_legal_moves()
+
+            # count the searches run with a zero-width window
+            search = agentUT.alphabeta
+            null_windows[name] = 0
+            def alphabeta(game, depth, alpha=float("-inf"), beta=float("inf"),
+                          maximizing_player=True, name=name, search=search):
+                if alpha == beta:
+                    null_windows[name] += 1
+                return search(game, depth, alpha, beta, maximizing_player)
+            agentUT.alphabeta = alphabeta
+
+            move = agentUT.get_move(board, legal_moves, lambda: 1e4)
+            self.assertIn(move, legal_moves)
+            results[name] = agentUT.stats.moves[-1]
+
+        plain = results["plain"]
+        self.assertEqual((plain["reductions"], plain["futility_prunes"]), (0, 0))
+        self.assertEqual((null_windows["plain"], results["shallow"]["reductions"]), (0, 0))
+        for name in ("lmr", "eager"):
+            self.assertTrue(results[name]["reductions"] > results[name]["researches"])
+            self.assertTrue(results[name]["nodes"] < plain["nodes"])
+            self.assertTrue(null_windows[name] >= results[name]["reductions"])
+        self.assertTrue(results["eager"]["reductions"] > results["lmr"]["reductions"])
+        self.assertNotEqual(game_agent.CustomPlayer(lmr=True).cache_config(),
+                            game_agent.CustomPlayer(lmr=True, lmr_reduction=2).cache_config())
+        self.assertTrue(results["futility"]["futility_prunes"] > 0)
+        self.assertTrue(results["futility"]["nodes"] < plain["nodes"])
+
+    @timeout(10)
+    def test_symmetric_tt(self):
+        """ Test symmetric positions share transposition table entries """
+        heuristic = game_agent.increase_own_moves_score
+        agentUT = game_agent.CustomPlayer(3, heuristic, False, "alphabeta",
+                                          reuse_tree=True, symmetry_plies=4)
+        plain = game_agent.CustomPlayer(3, heuristic, False, "alphabeta")
+        for player in (agentUT, plain):
+            player.time_left = lambda: 1e3
+            player._next_poll = float("inf")
+
+        board = isolation.Board(agentUT, "null_agent", 7, 7)
+        board.apply_move((2, 3))
+        board.apply_move((0, 1))
+        mirror = isolation.Board(agentUT, "null_agent", 7, 7)
+        mirror.apply_move((2, 3))
+        mirror.apply_move((0, 5))
+
+        value, move = agentUT.alphabeta(board, 3)
+        unshared = isolation.Board(plain, "null_agent", 7, 7)
+        unshared.apply_move((2, 3))
+        unshared.apply_move((0, 1))
+        self.assertEqual(value, plain.alphabeta(unshared, 3)[0])
+        key, entry, _ = agentUT._probe(mirror)
+        self.assertEqual(key, agentUT._probe(board)[0])
+        self.assertEqual(entry[3], (move[0], 6 - move[1]))
+        self.assertIn(entry[3], mirror.get_legal_moves())
+
+        # moving to a root symmetric to the searched one keeps the entries
+        # stored under canonical keys, and drops unreachable ones
+        canonical = set(k for k in agentUT.tt if isolation.bitboard.popcount(k[0]) < 4)
+        self.assertTrue(canonical)
+        unreachable = (1 | 1 << 48, 0, 48)
+        agentUT.tt[unreachable] = (1, 0., game_agent.EXACT, (0, 0))
+        agentUT._root_key = (1 << (2 * 7 + 3), 2 * 7 + 3, -1)
+        agentUT._rebase(mirror)
+        self.assertTrue(canonical <= set(agentUT.tt))
+        self.assertNotIn(unreachable, agentUT.tt)
+
+        # the canonical key is only used in the first symmetry_plies moves
+        agentUT.symmetry_plies = 2
+        self.assertEqual(agentUT._probe(mirror)[0], mirror.position_key())
+
+        cache = game_agent.EvalCache(heuristic, symmetry_plies=4)
+        cache(board, agentUT)
+        self.assertEqual(cache(mirror, agentUT), heuristic(mirror, agentUT))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    @timeout(20)
+    def test_node_clock(self):
+        """ Test games timed by a node clock are reproducible """
+        results = []
+        for _ in range(2):
+            agents = [game_agent.CustomPlayer(score_fn=sample_players.improved_score,
+                                              method="alphabeta", collect_stats=True),
+                      game_agent.CustomPlayer(method="alphabeta")]
+            board = isolation.Board(agents[0], agents[1], 5, 5)
+            board.apply_move((2, 2))
+            board.apply_move((0, 1))
+            winner, history, termination = board.play(time_limit=30,
+                                                      clock=isolation.NodeClock(20.))
+            self.assertNotEqual(termination, "timeout")
+            results.append((agents.index(winner), history, agents[0].nodes_searched,
+                            [r["depth"] for r in agents[0].stats.moves]))
+        self.assertEqual(results[0], results[1])
+
+        # each turn is limited to about time_limit * nodes_per_ms nodes
+        player = game_agent.CustomPlayer(method="alphabeta")
+        board = isolation.Board(player, "null_agent", 7, 7)
+        time_left = isolation.NodeClock(10.).timer(player, 50)
+        player.get_move(board, board.get_legal_moves(), time_left)
+        self.assertTrue(400 <= player.nodes_searched <= 500)
+
+    def test_move_cache(self):
+        """ Test fixed-depth moves are reused from the on-disk cache """
+        # not run under @timeout: the cache is a file opened by this process
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "moves.db")
+            cache = game_agent.MoveCache(path)
+            player = game_agent.CustomPlayer(search_depth=3, method="alphabeta",
+                                             iterative=False, move_cache=cache)
+            board = isolation.Board(player, "null_agent", 7, 7)
+            board.apply_move((3, 3))
+            board.apply_move((0, 0))
+            legal_moves = board.get_legal_moves()
+            move = player.get_move(board, legal_moves, lambda: 1000)
+            self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 1, 1))
+
+            nodes = player.nodes_searched
+            self.assertEqual(player.get_move(board, legal_moves, lambda: 1000), move)
+            self.assertEqual(player.nodes_searched, nodes)
+            self.assertEqual(cache.hits, 1)
+
+            # the file is shared by other instances; keys depend on the config
+            shared = game_agent.MoveCache(path)
+            other = game_agent.CustomPlayer(search_depth=3, method="alphabeta",
+                                            iterative=False, move_cache=shared)
+            board = isolation.Board(other, "null_agent", 7, 7)
+            board.apply_move((3, 3))
+            board.apply_move((0, 0))
+            self.assertEqual(other.get_move(board, legal_moves, lambda: 1000), move)
+            self.assertEqual((shared.hits, other.nodes_searched), (1, 0))
+            other.search_depth = 2
+            other.get_move(board, legal_moves, lambda: 1000)
+            self.assertEqual((shared.misses, len(shared)), (1, 2))
+
+            # searches cut short by the timeout are not stored
+            other.search_depth = 4
+            other.get_move(board, legal_moves, lambda: 0)
+            self.assertEqual(len(shared), 2)
+            cache.close()
+            shared.close()
+
+        # score functions without a stable name can't share a cache key
+        def make_score(weight):
+            def score(game, player):
+                return weight * len(game.get_legal_moves(player))
+            return score
+        self.assertEqual(game_agent.score_name(sample_players.improved_score),
+                         "sample_players.improved_score")
+        self.assertEqual(game_agent.score_name(game_agent.WeightedMobilityScore()),
+                         repr(game_agent.WeightedMobilityScore()))
+        for score_fn in (lambda game, player: 0., make_score(2.),
+                         functools.partial(sample_players.improved_score)):
+            self.assertIsNone(game_agent.score_name(score_fn))
+            with self.assertRaises(ValueError):
+                game_agent.CustomPlayer(iterative=False, score_fn=score_fn,
+                                        move_cache=game_agent.MoveCache(":memory:"))
+        score_fn = make_score(3.)
+        score_fn.cache_name = "weighted_moves(3)"
+        self.assertEqual(game_agent.score_name(game_agent.EvalCache(score_fn)),
+                         "weighted_moves(3)")
+
+    @timeout(10)
+    def test_mcts_player(self):
+        """ Test MCTSPlayer returns legal moves and reuses its subtree """
+        agentUT = mcts.MCTSPlayer(seed=0)
+        board = isolation.Board(agentUT, 'null_agent', 7, 7)
+        board.apply_move((2, 3))
+        board.apply_move((0, 0))
+        playouts = iter(range(2000))
+        time_left = lambda: 100 if next(playouts, None) is not None else 0
+
+        legal_moves = board.get_legal_moves()
+        move = agentUT.get_move(board, legal_moves, time_left)
+        self.assertIn(move, legal_moves)
+        self.assertEqual(agentUT.root.visits, 2000)
+
+        board.apply_move(move)
+        board.apply_move(board.get_legal_moves()[0])
+        subtree = agentUT._reuse(mcts.board_state(board))
+        self.assertIsNotNone(subtree)
+        self.assertTrue(subtree.visits > 0)
+
+
+    @timeout(20)
+    def test_parallel_mcts_player(self):
+        """ Test ParallelMCTSPlayer in both modes, and that rounds cut off by
+        the deadline leave a usable tree """
+        class TimedOutPool(object):
+            def map_async(self, fn, tasks):
+                return self
+
+            def get(self, timeout=None):
+                raise TimeoutError()
+
+        def visits(node):
+            return [node.visits] + [v for child in node.children.values()
+                                    for v in visits(child)]
+
+        with self.assertRaises(ValueError):
+            mcts.ParallelMCTSPlayer(processes=1, mode='tree', virtual_loss=0)
+
+        for mode in ('root', 'tree'):
+            agentUT = mcts.ParallelMCTSPlayer(processes=1, mode=mode, seed=0)
+            pool = agentUT.pool
+            try:
+                board = isolation.Board(agentUT, 'null_agent', 7, 7)
+                board.apply_move((2, 3))
+                board.apply_move((0, 0))
+                legal_moves = board.get_legal_moves()
+                deadline = curr_time_millis() + 150
+                time_left = lambda: deadline - curr_time_millis()
+                self.assertIn(agentUT.get_move(board, legal_moves, time_left), legal_moves)
+                self.assertTrue(time_left() > 0)
+                self.assertTrue(agentUT.nodes_searched > 0)
+
+                if mode == 'tree':
+                    # a round cut off by the deadline leaves a tree that can
+                    # be searched again
+                    root, state = agentUT.root, agentUT._root_state
+                    tables = mcts.knight_tables(7, 7)
+                    agentUT.pool = TimedOutPool()
+                    agentUT.search(root, state, tables, lambda: 100)
+                    self.assertNotIn(0, visits(root))
+                    agentUT.pool = pool
+                    deadline = curr_time_millis() + 50
+                    agentUT.search(root, state, tables, time_left)
+                    self.assertNotIn(0, visits(root))
+
+                # workers that don't answer in time: fall back to a legal move
+                agentUT.pool = TimedOutPool()
+                deadline = curr_time_millis() + 50
+                self.assertIn(agentUT.get_move(board, legal_moves, time_left), legal_moves)
+            finally:
+                agentUT.pool = pool
+                agentUT.close()
+
+
 if __name__ == '__main__':
     unittest.main()
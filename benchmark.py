@@ -0,0 +1,229 @@
+"""
+Micro-benchmarks for the board primitives and score functions that every
+search node calls.  Each primitive is timed on randomly generated positions
+across a range of board sizes and fill levels (the fraction of cells that
+are blocked), repeated several times so that the reported cost per call is
+stable.
+
+Results can be saved to a JSON file and compared against a previous run to
+catch performance regressions:
+
+    python benchmark.py --save bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --threshold 1.25
+
+The script exits with a non-zero status if any primitive became slower than
+`threshold` times its baseline cost.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import timeit
+
+from isolation import Board
+from isolation import MobilityBoard
+from isolation import CompactBoard
+import game_agent
+import sample_players
+
+BOARD_CLASSES = {"Board": Board, "MobilityBoard": MobilityBoard,
+                 "CompactBoard": CompactBoard}
+BOARD_SIZES = [(5, 5), (7, 7), (9, 9), (11, 11)]
+FILL_LEVELS = [0.1, 0.4, 0.7]
+REPEAT = 5           # number of independent timing samples per primitive
+POSITIONS = 20       # number of random positions timed per sample
+MIN_SAMPLE_TIME = 0.02  # seconds; the loop count is scaled up to reach this
+
+SCORE_FUNCTIONS = [
+    ("null_score", sample_players.null_score),
+    ("open_move_score", sample_players.open_move_score),
+    ("improved_score", sample_players.improved_score),
+    ("custom_score", game_agent.custom_score),
+    ("penalize_edges", game_agent.penalize_edges),
+    ("penalize_edges_overlay_moves", game_agent.penalize_edges_overlay_moves),
+    ("square_move_diff", game_agent.square_move_diff),
+    ("increase_own_moves_score", game_agent.increase_own_moves_score),
+    ("increase_opponent_move_penalty_near_endgame",
+     game_agent.increase_opponent_move_penalty_near_endgame),
+    ("reachable_area_score", game_agent.reachable_area_score),
+    ("depth_limited_reach_score", game_agent.depth_limited_reach_score),
+]
+CACHED_SCORE = sample_players.improved_score  # wrapped by the eval_cache_* entries
+
+
+def random_board(width, height, fill, rng, board_class=Board):
+    """Create a position with (approximately) `fill` of its cells blocked.
+
+    Cells are blocked by applying moves to random blank cells, alternating
+    between the players, so the last two cells blocked are the player
+    locations.  The moves are not required to be legal knight moves, which
+    lets the generator reach any fill level on any board size.
+
+    Parameters
+    ----------
+    width, height : int
+        Dimensions of the board.
+
+    fill : float
+        Fraction of cells that should be blocked, in [0, 1).
+
+    rng : random.Random
+        Source of randomness, so that runs can be reproduced.
+
+    board_class : class (optional)
+        The board implementation to construct.
+
+    Returns
+    ----------
+    `isolation.Board`
+        The generated position.
+    """
+    game = board_class("player1", "player2", width=width, height=height)
+    cells = [(r, c) for r in range(height) for c in range(width)]
+    rng.shuffle(cells)
+    num_blocked = max(2, int(fill * width * height))
+    for move in cells[:num_blocked]:
+        game.apply_move(move)
+    return game
+
+
+def primitives(game):
+    """Return a list of (name, callable) pairs, each exercising one board
+    primitive or score function on `game`.
+    """
+    player = game.active_player
+    moves = game.get_legal_moves() or [game.get_blank_spaces()[0]]
+    move = moves[0]
+
+    def apply_move():
+        game.copy().apply_move(move)
+
+    # a cache holding the position, and one that can hold nothing, so that
+    # every lookup misses and pays for scoring and inserting the entry
+    hit_cache = game_agent.EvalCache(CACHED_SCORE)
+    hit_cache(game, player)
+    miss_cache = game_agent.EvalCache(CACHED_SCORE, max_entries=0)
+
+    tests = [
+        ("get_legal_moves", game.get_legal_moves),
+        ("get_blank_spaces", game.get_blank_spaces),
+        ("copy", game.copy),
+        ("forecast_move", lambda: game.forecast_move(move)),
+        ("copy+apply_move", apply_move),
+        ("utility", lambda: game.utility(player)),
+        ("position_key", game.position_key),
+        ("eval_cache_hit", lambda: hit_cache(game, player)),
+        ("eval_cache_miss", lambda: miss_cache(game, player)),
+    ]
+    for name, score_fn in SCORE_FUNCTIONS:
+        tests.append((name, lambda fn=score_fn: fn(game, player)))
+    return tests
+
+
+def time_primitive(calls, repeat=REPEAT):
+    """Time a list of zero-argument callables (one per position).
+
+    Returns a dict with the minimum, median and standard deviation of the
+    cost per call in microseconds over `repeat` samples.
+    """
+    def run_all():
+        for call in calls:
+            call()
+
+    timer = timeit.Timer(run_all)
+    number = 1
+    while timer.timeit(number) < MIN_SAMPLE_TIME:
+        number *= 2
+
+    samples = [t / (number * len(calls)) * 1e6
+               for t in timer.repeat(repeat=repeat, number=number)]
+    return {"min": min(samples),
+            "median": statistics.median(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.}
+
+
+def run(sizes=BOARD_SIZES, fills=FILL_LEVELS, repeat=REPEAT, seed=0,
+        board_class=Board):
+    """Benchmark every primitive for each board size and fill level.
+
+    Returns
+    ----------
+    dict
+        Maps "<primitive>@<width>x<height>/<fill>" to the timing summary
+        returned by `time_primitive`.
+    """
+    rng = random.Random(seed)
+    results = {}
+    for width, height in sizes:
+        for fill in fills:
+            games = [random_board(width, height, fill, rng, board_class)
+                     for _ in range(POSITIONS)]
+            per_game = [primitives(game) for game in games]
+            for idx, (name, _) in enumerate(per_game[0]):
+                calls = [tests[idx][1] for tests in per_game]
+                key = "{}@{}x{}/{:.2f}".format(name, width, height, fill)
+                results[key] = time_primitive(calls, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of (key, baseline_us, current_us) entries whose median
+    cost regressed by more than `threshold` relative to the baseline.
+    """
+    regressions = []
+    for key, summary in sorted(results.items()):
+        if key not in baseline:
+            continue
+        old = baseline[key]["median"]
+        new = summary["median"]
+        if old > 0 and new / old > threshold:
+            regressions.append((key, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", type=int,
+                        help="square board sizes to benchmark (default: 5 7 9 11)")
+    parser.add_argument("--fills", nargs="+", type=float, default=FILL_LEVELS,
+                        help="fractions of blocked cells to benchmark")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="number of timing samples per primitive")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--board", choices=sorted(BOARD_CLASSES), default="Board",
+                        help="board implementation to benchmark")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="maximum allowed ratio of current to baseline cost")
+    args = parser.parse_args()
+
+    sizes = [(s, s) for s in args.sizes] if args.sizes else BOARD_SIZES
+    results = run(sizes, args.fills, args.repeat, args.seed,
+                  BOARD_CLASSES[args.board])
+
+    print("{:<62}{:>10}{:>10}{:>10}".format("primitive", "min us", "med us", "stdev"))
+    for key, summary in sorted(results.items()):
+        print("{:<62}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+            key, summary["min"], summary["median"], summary["stdev"]))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions (median cost above {:.2f}x baseline):".format(args.threshold))
+            for key, old, new in regressions:
+                print("  {:<60}{:>10.2f} -> {:.2f} us".format(key, old, new))
+            sys.exit(1)
+        print("\nNo regressions above {:.2f}x baseline.".format(args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,126 @@ relative strength using tournament.py and include the results in your report.
 import random
 import math
 import pickle
+import json
+import os
+import sqlite3
+import threading
+import timeit
+
+from collections import Counter
+from collections import OrderedDict
+
+import isolation.vectorized
+
+from isolation.bitboard import knight_tables
+from isolation.bitboard import cell_index
+from isolation.bitboard import popcount
+from isolation.bitboard import reachable
+from isolation.symmetry import canonical_key
+from isolation.symmetry import symmetries
+from isolation.symmetry import bit_key
+from isolation.vectorized import vectorized
+from isolation.vectorized import batch_mobility
+from isolation.vectorized import own_and_opponent
+from isolation.vectorized import with_terminal_scores
 
 class Timeout(Exception):
     """Subclass base exception for code clarity."""
     pass
 
 
+class SearchStats:
+    """Collect per-move search statistics for a `CustomPlayer`.
+
+    The counters for the move in progress are plain attributes so that the
+    search can update them cheaply; `end_move` snapshots them into a record.
+    A new game is detected automatically when the board's move count goes
+    backwards, so the records can be dumped per game.
+
+    Each record is a dict with the keys:
+
+    - move_count : plies played before the move was chosen
+    - move : the move returned
+    - depth : deepest fully completed search iteration
+    - nodes : nodes visited by minimax/alphabeta
+    - leaves : heuristic evaluations performed
+    - cutoffs : beta cutoffs keyed by the index of the move causing them
+    - tt_probes, tt_hits : transposition table lookups and hits
+    - reductions, researches : late moves searched at reduced depth, and
+      those re-searched at full depth because they improved the bound
+    - futility_prunes : moves pruned by futility pruning
+    - time_left : milliseconds remaining on the clock at return
+    """
+
+    def __init__(self):
+        self.games = []
+        self._last_move_count = None
+        self.reset_counters()
+
+    def reset_counters(self):
+        """Clear the counters for the move in progress."""
+        self.depth = 0
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = Counter()
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.reductions = 0
+        self.researches = 0
+        self.futility_prunes = 0
+
+    def start_move(self, game):
+        """Begin collecting statistics for a search from `game`."""
+        if self._last_move_count is None or game.move_count < self._last_move_count:
+            self.games.append([])
+        self._last_move_count = game.move_count
+        self.reset_counters()
+
+    def end_move(self, game, move, time_left):
+        """Record the statistics for the move just chosen."""
+        self.games[-1].append({
+            "move_count": game.move_count,
+            "move": move,
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "cutoffs": dict(self.cutoffs),
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "reductions": self.reductions,
+            "researches": self.researches,
+            "futility_prunes": self.futility_prunes,
+            "time_left": time_left,
+        })
+
+    @property
+    def moves(self):
+        """All per-move records, across every game, in play order."""
+        return [record for game in self.games for record in game]
+
+    def tt_hit_rate(self):
+        """Fraction of transposition table probes that hit, over all moves."""
+        probes = sum(r["tt_probes"] for r in self.moves)
+        return sum(r["tt_hits"] for r in self.moves) / probes if probes else 0.
+
+    def dump(self, path=None):
+        """Return the per-game records, optionally writing them as JSON to
+        `path`.
+        """
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(self.games, f, indent=2)
+        return self.games
+
+
+def custom_score_batch(game, moves, player):
+    # Batched custom_score for the positions after each of the moves
+    mover, other = batch_mobility(game, moves)
+    own, opp = own_and_opponent(game, player, mover, other)
+    theta = 0.75 if game.move_count + 1 > 25 else 1.3
+    return with_terminal_scores(theta*own - opp, game, player, other)
+
+@vectorized(custom_score_batch)
 def custom_score(game, player):
     """Calculate the heuristic value of a game state from the point of view
     of the given player.
@@ -91,35 +205,467 @@ def penalize_edges_overlay_moves(game, player):
     opp_moves = game.get_legal_moves(game.get_opponent(player))
     return penalize_moves(own_moves, game) - penalize_moves(opp_moves, game)
 
+def square_move_diff_batch(game, moves, player):
+    # Batched square_move_diff for the positions after each of the moves
+    own, opp = own_and_opponent(game, player, *batch_mobility(game, moves))
+    return (own**2 - opp**2).astype(float).tolist()
+
+@vectorized(square_move_diff_batch)
 def square_move_diff(game, player):
     # This custom score is similar to the sample player "improved_score"
     # but scores with the square of the difference of moves reflecting the
     # increased likelihood of getting trapped
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = game.mobility(player)
+    opp_moves = game.mobility(game.get_opponent(player))
     return math.pow(own_moves,2) - math.pow(opp_moves, 2)
 
+def increase_own_moves_score_batch(game, moves, player):
+    # Batched increase_own_moves_score for the positions after each move
+    own, opp = own_and_opponent(game, player, *batch_mobility(game, moves))
+    return (1.3*own - opp).tolist()
+
+@vectorized(increase_own_moves_score_batch)
 def increase_own_moves_score(game, player):
     # This custom score is similar to the improved score, but we double
     # the value of the player's moves
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = game.mobility(player)
+    opp_moves = game.mobility(game.get_opponent(player))
     return 1.3*own_moves - opp_moves
 
+def increase_opponent_move_penalty_near_endgame_batch(game, moves, player):
+    # Batched increase_opponent_move_penalty_near_endgame for the positions
+    # after each of the moves; the children are one ply further on
+    own, opp = own_and_opponent(game, player, *batch_mobility(game, moves))
+    theta = 0.75 if game.move_count + 1 > 25 else 1.3
+    return (theta*own - opp).tolist()
+
+@vectorized(increase_opponent_move_penalty_near_endgame_batch)
 def increase_opponent_move_penalty_near_endgame(game, player):
     # This custom score is similar to increase_own_moves_score but
     # changes the coefficient near the endgame to emphasize reducing
     # the opponent's move
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = game.mobility(player)
+    opp_moves = game.mobility(game.get_opponent(player))
     theta = 1.3
     if game.move_count > 25:
         theta = 0.75
     return theta*own_moves - opp_moves
 
+class WeightedMobilityScore:
+    """Parameterized form of custom_score: the same win/loss checks and
+    `own_weight * own_moves - opp_moves`, with `own_weight` switching to
+    `endgame_own_weight` after `endgame_move` plies. The defaults reproduce
+    custom_score (increase_opponent_move_penalty_near_endgame), and
+    `endgame_own_weight == own_weight` gives increase_own_moves_score.
+
+    Instances are picklable so they can be shipped to worker processes,
+    e.g., by the weight tuning script tune.py.
+
+    Parameters
+    ----------
+    own_weight : float (optional)
+        Weight of the player's own move count early in the game.
+
+    endgame_own_weight : float (optional)
+        Weight of the player's own move count in the endgame.
+
+    endgame_move : float (optional)
+        Number of plies after which the endgame weight applies.
+    """
+
+    def __init__(self, own_weight=1.3, endgame_own_weight=0.75, endgame_move=25):
+        self.own_weight = own_weight
+        self.endgame_own_weight = endgame_own_weight
+        self.endgame_move = endgame_move
+        if isolation.vectorized.np is not None:
+            self.batch = self._batch
+
+    def weights(self, move_count):
+        """The weight of the player's own moves at the given ply."""
+        if move_count > self.endgame_move:
+            return self.endgame_own_weight
+        return self.own_weight
+
+    def __call__(self, game, player):
+        if game.is_loser(player):
+            return float("-inf")
+
+        if game.is_winner(player):
+            return float("inf")
+
+        own_moves = game.mobility(player)
+        opp_moves = game.mobility(game.get_opponent(player))
+        return self.weights(game.move_count)*own_moves - opp_moves
+
+    def _batch(self, game, moves, player):
+        mover, other = batch_mobility(game, moves)
+        own, opp = own_and_opponent(game, player, mover, other)
+        theta = self.weights(game.move_count + 1)
+        return with_terminal_scores(theta*own - opp, game, player, other)
+
+    def __repr__(self):
+        return "WeightedMobilityScore({!r}, {!r}, {!r})".format(
+            self.own_weight, self.endgame_own_weight, self.endgame_move)
+
+REACH_DEPTH = 3  # number of moves looked ahead by depth_limited_reach_score
+
+def reach_counts(game, player, max_depth=None):
+    # Count the blank cells each player could reach by knight moves if the
+    # other player stood still, optionally within max_depth moves, using a
+    # bitmask flood fill. Returns (own, opponent) counts.
+    tables = knight_tables(game.width, game.height)
+    blank = tables.full & ~game.position_key()[0]
+    counts = []
+    for p in (player, game.get_opponent(player)):
+        location = game.get_player_location(p)
+        start = None if location is None else cell_index(location, game.width)
+        counts.append(popcount(reachable(tables, start, blank, max_depth)))
+    return counts
+
+def reachable_area_score(game, player):
+    # This custom score compares the size of the region each player can
+    # still reach. Once the players are separated it predicts the winner
+    # far beyond the search horizon.
+    if game.is_loser(player):
+        return float("-inf")
+
+    if game.is_winner(player):
+        return float("inf")
+
+    own_area, opp_area = reach_counts(game, player)
+    return float(own_area - opp_area)
+
+def depth_limited_reach_score(game, player):
+    # This custom score is similar to improved_score but counts every cell
+    # reachable within REACH_DEPTH moves instead of only the next move
+
+    if game.is_loser(player):
+        return float("-inf")
+
+    if game.is_winner(player):
+        return float("inf")
+
+    own_reach, opp_reach = reach_counts(game, player, REACH_DEPTH)
+    return float(own_reach - opp_reach)
+
+class EvalCache:
+    """Bounded cache wrapping a score function, so that positions reached
+    again (e.g., in the next iteration of iterative deepening) are not
+    evaluated twice. Entries are keyed on `game.position_key()` and the
+    scoring player, and the least recently used entry is evicted once the
+    cache holds `max_entries`. The score function must be a pure function of
+    the position. Use a board whose `position_key()` is O(1), like
+    `MobilityBoard` or `CompactBoard`, or a hit can cost more than a cheap
+    score function.
+
+    If the score function has a batched implementation, the cache exposes
+    one too: the keys of the children are derived from the key of the
+    parent, and only the children missing from the cache are scored, in one
+    call to the wrapped `batch`.
+
+    Parameters
+    ----------
+    score_fn : callable
+        The score function to cache, e.g., `custom_score`.
+
+    max_entries : int (optional)
+        Maximum number of cached evaluations.
+
+    symmetry_plies : int (optional)
+        Positions with fewer moves played are keyed on their canonical image
+        under the board symmetries (`isolation.symmetry`), so rotations and
+        reflections of a position share an entry. Only valid for score
+        functions that are invariant under those symmetries, as the
+        mobility-based ones are.
+    """
+
+    def __init__(self, score_fn, max_entries=100000, symmetry_plies=0):
+        self.score_fn = score_fn
+        self.max_entries = max_entries
+        self.symmetry_plies = symmetry_plies
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if getattr(score_fn, 'batch', None) is not None:
+            self.batch = self._batch
+
+    def _lookup(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def _insert(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def __call__(self, game, player):
+        if game.move_count < self.symmetry_plies:
+            key = (canonical_key(game), player)
+        else:
+            key = (game.position_key(), player)
+        value = self._lookup(key)
+        if value is not None:
+            return value
+        self.misses += 1
+        value = self.score_fn(game, player)
+        self._insert(key, value)
+        return value
+
+    def _batch(self, game, moves, player):
+        # the key of the position after moving to cell c: c becomes blocked
+        # and is the new location of the player to move (player 1 after an
+        # even number of moves)
+        mask, first, second = game.position_key()
+        symmetric = game.move_count + 1 < self.symmetry_plies
+        canonical = symmetries(game.width, game.height).canonical
+        values = []
+        missing = []
+        for idx, (row, col) in enumerate(moves):
+            cell = row * game.width + col
+            if game.move_count % 2 == 0:
+                key = (mask | 1 << cell, cell, second)
+            else:
+                key = (mask | 1 << cell, first, cell)
+            key = (canonical(*key) if symmetric else key, player)
+            value = self._lookup(key)
+            if value is None:
+                missing.append((idx, key))
+            values.append(value)
+        if missing:
+            self.misses += len(missing)
+            scores = self.score_fn.batch(game, [moves[idx] for idx, _ in missing], player)
+            for (idx, key), value in zip(missing, scores):
+                values[idx] = value
+                self._insert(key, value)
+        return values
+
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def score_name(score_fn):
+    """Return a name for a score function that is stable across runs and
+    identifies it uniquely, for use in persistent cache keys, or None if it
+    has none.
+
+    A `cache_name` attribute of the score function is used if present.
+    Otherwise module-level functions are named by their qualified name and
+    other callables by their repr. Lambdas, closures (which share the
+    qualified name of every function made by the same factory) and reprs
+    holding a memory address (e.g. `functools.partial` objects) have no
+    stable name.
+    """
+    if isinstance(score_fn, EvalCache):
+        return score_name(score_fn.score_fn)
+    name = getattr(score_fn, "cache_name", None)
+    if name is not None:
+        return name
+    name = getattr(score_fn, "__qualname__", None)
+    if name is not None:
+        if "<lambda>" in name or "<locals>" in name:
+            return None
+        return "{}.{}".format(score_fn.__module__, name)
+    name = repr(score_fn)
+    return None if " at 0x" in name else name
+
+
+class MoveCache:
+    """Persistent on-disk cache of the moves chosen by deterministic agents,
+    stored in an SQLite database so that it can be shared by concurrent
+    worker processes and reused by later runs. Entries are keyed on a string
+    describing the agent configuration and the `to_bytes()` encoding of the
+    position; see the `move_cache` parameter of `CustomPlayer`.
+
+    The cache can't tell when the code of a score function changes; pass a
+    new `version` (or delete the file) when it does.
+
+    Parameters
+    ----------
+    path : str
+        Location of the database file, created if it doesn't exist.
+
+    version : str (optional)
+        Prefix added to every configuration key.
+    """
+
+    def __init__(self, path, version=""):
+        self.path = path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        """Return this process's connection to the database."""
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS moves (config TEXT, position BLOB, "
+                "move INTEGER, PRIMARY KEY (config, position))")
+            self._pid = os.getpid()
+        return self._connection
+
+    def lookup(self, config, game):
+        """Return the cached move for `game`, or None."""
+        row = self._connect().execute(
+            "SELECT move FROM moves WHERE config = ? AND position = ?",
+            (self.version + config, game.to_bytes())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return isolation.decode_move(row[0], game.width)
+
+    def store(self, config, game, move):
+        """Record the move chosen in `game`."""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO moves VALUES (?, ?, ?)",
+            (self.version + config, game.to_bytes(), isolation.encode_move(move, game.width)))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+
+    def close(self):
+        """Close the database connection of this process."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __getstate__(self):
+        # connections can't be pickled; each process opens its own
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+
+POLL_MILLIS = 2.  # target interval (in ms) between clock reads when polling
+PONDER_MILLIS = 10000.  # maximum time (in ms) spent pondering between moves
+TT_MAX_ENTRIES = 1000000  # transposition table entries kept between moves
+
+# Transposition table entry flags: the stored value is exact, a lower
+# bound (the search failed high) or an upper bound (it failed low)
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Search value of a won terminal position, less the number of moves played to
+# reach it, so that shorter wins and longer losses are preferred. Values
+# beyond PROVEN_SCORE in magnitude are proven wins or losses.
+WIN_SCORE = 1000000.
+PROVEN_SCORE = WIN_SCORE / 2
+
+# Default late move reduction settings of CustomPlayer: from depth
+# LMR_MIN_DEPTH, moves after the first LMR_FULL_MOVES in the ordering are
+# searched LMR_REDUCTION plies shallower
+LMR_MIN_DEPTH = 3
+LMR_FULL_MOVES = 3
+LMR_REDUCTION = 1
+
+
+class TimeManager:
+    """Decide whether iterative deepening should start another iteration.
+
+    The cost of the next iteration is predicted from the time taken by the
+    completed ones and their effective branching factor. An iteration is
+    only started if it is expected to finish before the search timeout;
+    while the best move keeps changing between iterations the manager is
+    willing to gamble on a tighter fit, since more search is most likely to
+    change the decision then.
+
+    Parameters
+    ----------
+    stable_margin : float (optional)
+        Start the next iteration when the best move is stable only if its
+        predicted cost is at most this fraction of the remaining time.
+
+    unstable_margin : float (optional)
+        The same fraction when the best move changed recently. Values above
+        1.0 allow iterations that are predicted to slightly overrun.
+
+    stable_iterations : int (optional)
+        Number of consecutive iterations that must agree on the best move
+        for it to be considered stable.
+
+    default_ebf : float (optional)
+        Effective branching factor assumed before two iterations complete.
+
+    max_ebf : float (optional)
+        Upper bound on the measured effective branching factor.
+    """
+
+    def __init__(self, stable_margin=1.0, unstable_margin=1.5,
+                 stable_iterations=2, default_ebf=5., max_ebf=8.):
+        self.stable_margin = stable_margin
+        self.unstable_margin = unstable_margin
+        self.stable_iterations = stable_iterations
+        self.default_ebf = default_ebf
+        self.max_ebf = max_ebf
+        self.iteration_times = []
+        self.best_moves = []
+        self._last_time = 0.
+
+    def start(self, time_left):
+        """Reset the measurements at the start of a move."""
+        self.iteration_times = []
+        self.best_moves = []
+        self._last_time = time_left()
+
+    def record(self, move, time_left):
+        """Record the completion of an iteration that chose `move`, and return
+        the time remaining."""
+        remaining = time_left()
+        self.iteration_times.append(max(self._last_time - remaining, 0.))
+        self.best_moves.append(move)
+        self._last_time = remaining
+        return remaining
+
+    def effective_branching_factor(self):
+        """Growth in search time per additional ply."""
+        times = self.iteration_times
+        if len(times) >= 3 and times[-3] > 0:
+            # Compare iterations two plies apart to smooth out the
+            # odd-even effect of alpha-beta pruning
+            ebf = math.sqrt(times[-1] / times[-3])
+        elif len(times) >= 2 and times[-2] > 0:
+            ebf = times[-1] / times[-2]
+        else:
+            ebf = self.default_ebf
+        return min(max(ebf, 1.), self.max_ebf)
+
+    def predicted_cost(self):
+        """Predicted time (in milliseconds) for the next iteration."""
+        if not self.iteration_times:
+            return 0.
+        return self.iteration_times[-1] * self.effective_branching_factor()
+
+    def is_stable(self):
+        """Test whether the last iterations agreed on the best move."""
+        recent = self.best_moves[-self.stable_iterations:]
+        return len(recent) == self.stable_iterations and len(set(recent)) == 1
+
+    def should_continue(self, remaining, threshold):
+        """Test whether another iteration should be started with `remaining`
+        milliseconds left and the search aborting at `threshold`."""
+        margin = self.stable_margin if self.is_stable() else self.unstable_margin
+        return self.predicted_cost() <= margin * (remaining - threshold)
+
+
 class CustomPlayer:
     """Game-playing agent that chooses a move using your evaluation function
     and a depth-limited minimax algorithm with alpha-beta pruning. You must
@@ -139,7 +685,9 @@ class CustomPlayer:
 
     iterative : boolean (optional)
         Flag indicating whether to perform fixed-depth search (False) or
-        iterative deepening search (True).
+        iterative deepening search (True). Iterative deepening stops as soon
+        as an iteration proves a win or loss, or reaches no heuristic leaf
+        (the game tree below the root is exhausted).
 
     method : {'minimax', 'alphabeta'} (optional)
         The name of the search method to use in get_move().
@@ -148,16 +696,121 @@ class CustomPlayer:
         Time remaining (in milliseconds) when search is aborted. Should be a
         positive value large enough to allow the function to return before the
         timer expires.
+
+    collect_stats : boolean (optional)
+        Flag indicating whether to record per-move search statistics in
+        `self.stats` (a `SearchStats` instance). When False, `self.stats` is
+        None and the search does no extra bookkeeping.
+
+    time_manager : `TimeManager` (optional)
+        If given, iterative deepening stops starting new iterations that the
+        time manager predicts cannot finish, instead of always searching
+        until the timeout.
+
+    poll_interval : int or 'auto' (optional)
+        Number of search nodes between calls to `time_left`. With 'auto' the
+        interval is recalibrated at every clock read from the measured node
+        rate so that reads happen roughly every `POLL_MILLIS`, shrinking as
+        the deadline approaches.
+
+    ponder : boolean (optional)
+        Flag indicating whether to keep searching in a background thread
+        while the opponent is thinking. The thread predicts the opponent's
+        reply and runs iterative deepening on the resulting position; if the
+        prediction was right, the next call to get_move() resumes from the
+        deepest pondered iteration. Only used with iterative deepening. Note
+        that the thread competes for the interpreter lock with an opponent
+        running in the same process. It is stopped by the next get_move(),
+        new_game() or stop_pondering(), which `Board.play` calls when the
+        game ends.
+
+    reuse_tree : boolean (optional)
+        Flag indicating whether alphabeta uses a transposition table and
+        history move ordering that persist across turns of the same game.
+        At each move the tables are rebased onto the new root by discarding
+        entries for positions that can no longer be reached, and iterative
+        deepening starts after the depth already stored for the root. The
+        tables are reset when a new game is detected.
+
+    opening_table : dict (optional)
+        Solved openings as loaded by `solver.load_table`, mapping
+        (width, height) to the game-theoretic value of each tabulated
+        position. On those board sizes, if a legal move leads to a position
+        proven lost for the opponent it is played without searching.
+
+    lmr : boolean (optional)
+        Flag indicating whether alphabeta uses late move reductions: moves
+        late in the ordering are first searched to a reduced depth, and only
+        re-searched to full depth if they improve on the current bound.
+
+    lmr_min_depth : int (optional)
+        Minimum remaining depth of the nodes whose late moves are reduced.
+
+    lmr_full_moves : int (optional)
+        Number of moves at the front of the ordering searched to full depth.
+
+    lmr_reduction : int (optional)
+        Number of plies by which late moves are reduced (the reduced search
+        keeps at least one ply).
+
+    futility_margin : float (optional)
+        If given, alphabeta prunes a move one ply above the frontier when
+        the heuristic value of the position it leads to is worse than the
+        current bound by more than this margin, instead of searching it.
+
+    symmetry_plies : int (optional)
+        With `reuse_tree`, positions with fewer moves played are stored in
+        the transposition table under their canonical image under the board
+        symmetries, so rotations and reflections of a position share an
+        entry. Stored best moves are mapped back onto the probed position.
+
+    move_cache : `MoveCache` (optional)
+        Persistent cache of the moves chosen by this agent. Only used for
+        fixed-depth search without `reuse_tree`, where the move is a
+        deterministic function of the position and the configuration.
+        Moves from searches cut short by the timeout are not stored. The
+        score function must have a stable name (see `score_name`).
     """
 
     def __init__(self, search_depth=3, score_fn=custom_score,
-                 iterative=True, method='minimax', timeout=10.):
+                 iterative=True, method='minimax', timeout=10.,
+                 collect_stats=False, time_manager=None, poll_interval=1,
+                 ponder=False, reuse_tree=False, opening_table=None,
+                 lmr=False, futility_margin=None, symmetry_plies=0,
+                 move_cache=None, lmr_min_depth=LMR_MIN_DEPTH,
+                 lmr_full_moves=LMR_FULL_MOVES, lmr_reduction=LMR_REDUCTION):
         self.search_depth = search_depth
         self.iterative = iterative
         self.score = score_fn
         self.method = method
         self.time_left = None
         self.TIMER_THRESHOLD = timeout
+        self.stats = SearchStats() if collect_stats else None
+        self.time_manager = time_manager
+        self.poll_interval = poll_interval
+        self.nodes_searched = 0
+        self._next_poll = 0
+        self._last_poll = None
+        self.ponder = ponder
+        self._ponder_thread = None
+        self._ponder_stop = None
+        self._ponder_result = None
+        self.reuse_tree = reuse_tree
+        self.tt = {} if reuse_tree else None
+        self.history = {}
+        self._root_key = None
+        self.opening_table = opening_table
+        self.heuristic_leaf = False
+        self.lmr = lmr
+        self.lmr_min_depth = lmr_min_depth
+        self.lmr_full_moves = lmr_full_moves
+        self.lmr_reduction = lmr_reduction
+        self.futility_margin = futility_margin
+        self.symmetry_plies = symmetry_plies
+        self.move_cache = move_cache
+        if move_cache is not None and score_name(score_fn) is None:
+            raise ValueError("can't cache the moves of score function {!r}: it has "
+                             "no stable name; give it a cache_name attribute".format(score_fn))
 
     def get_move(self, game, legal_moves, time_left):
         """Search for the best move from the available legal moves and return a
@@ -195,8 +848,141 @@ class CustomPlayer:
             (-1, -1) if there are no available legal moves.
         """
 
+        self.stop_pondering()
+        if self.reuse_tree:
+            self._rebase(game)
+
         self.time_left = time_left
+        self._next_poll = self.nodes_searched
+        self._last_poll = None
+
+        cache = self.move_cache
+        config = None
+        if cache is not None and not self.iterative and self.tt is None:
+            config = self.cache_config()
+        if config is not None:
+            move = cache.lookup(config, game)
+            if move in legal_moves:
+                return move
+        else:
+            cache = None
 
+        if self.stats is None:
+            move = self._search(game, legal_moves)
+        else:
+            self.stats.start_move(game)
+            move = self._search(game, legal_moves)
+            self.stats.end_move(game, move, self.time_left())
+
+        if cache is not None and move in legal_moves and self.time_left() > self.TIMER_THRESHOLD:
+            cache.store(config, game, move)
+
+        if self.ponder and self.iterative and move in legal_moves:
+            self._start_pondering(game.forecast_move(move))
+        return move
+
+    def cache_config(self):
+        """Describe the settings that determine the move chosen by fixed-depth
+        search, as the configuration key of `MoveCache` entries, or None if
+        the score function has no stable name."""
+        name = score_name(self.score)
+        if name is None:
+            return None
+        return "{}:{}:{}:lmr={}:lmr_min_depth={}:lmr_full_moves={}:lmr_reduction={}:" \
+               "futility={}:book={}".format(
+            self.method, self.search_depth, name, self.lmr, self.lmr_min_depth,
+            self.lmr_full_moves, self.lmr_reduction, self.futility_margin,
+            self.opening_table is not None)
+
+    def new_game(self):
+        """Discard the search state kept between turns, stopping any
+        pondering."""
+        self.stop_pondering()
+        if self.tt is not None:
+            self.tt = {}
+        self.history = {}
+        self._root_key = None
+        self._ponder_result = None
+
+    def _rebase(self, game):
+        """Prepare the persistent search state for a search from `game`.
+
+        Every move blocks a cell, so a stored position is reachable from the
+        new root only if its blocked cells include all of the root's. If the
+        root itself isn't reachable from the previous root, a new game has
+        started. Positions with fewer than `symmetry_plies` blocked cells are
+        stored under their canonical image, which is reachable if it
+        includes the image of the root under any of the symmetries.
+        """
+        key = game.position_key()
+        mask = key[0]
+        if self._root_key is None or mask & self._root_key[0] != self._root_key[0]:
+            self.new_game()
+        elif len(self.tt) > TT_MAX_ENTRIES:
+            self.tt = {}
+        else:
+            images = [mask]
+            if popcount(mask) < self.symmetry_plies:
+                sym = symmetries(game.width, game.height)
+                images = set(sym.transform_mask(i, mask) for i in range(len(sym.permutations)))
+            plies = self.symmetry_plies
+            self.tt = {k: v for k, v in self.tt.items()
+                       if k[0] & mask == mask or popcount(k[0]) < plies and
+                       any(k[0] & image == image for image in images)}
+            # age the history scores so recent cutoffs dominate
+            self.history = {m: h // 2 for m, h in self.history.items() if h > 1}
+        self._root_key = key
+
+    def _start_pondering(self, game):
+        """Search in a background thread from `game`, the position after our
+        move, until `stop_pondering` is called or `PONDER_MILLIS` elapse.
+        """
+        stop = threading.Event()
+        start = timeit.default_timer()
+        self.time_left = lambda: float("-inf") if stop.is_set() else \
+            PONDER_MILLIS - 1000 * (timeit.default_timer() - start)
+        self._next_poll = self.nodes_searched
+        self._last_poll = None
+        self._ponder_stop = stop
+        self._ponder_result = None
+        self._ponder_thread = threading.Thread(target=self._ponder, args=(game,))
+        self._ponder_thread.daemon = True
+        self._ponder_thread.start()
+
+    def _ponder(self, game):
+        """Predict the opponent's reply to the move just played and deepen
+        the search on the position it leads to, recording the best move of
+        each completed iteration in `self._ponder_result`.
+        """
+        method = self.minimax if self.method == 'minimax' else self.alphabeta
+        try:
+            _, reply = method(game, 2, maximizing_player=False)
+            if reply == (-1, -1):
+                return
+            predicted = game.forecast_move(reply)
+            key = predicted.position_key()
+            for d in range(1, 99):
+                self.heuristic_leaf = False
+                score, move = method(predicted, d)
+                if move == (-1, -1):
+                    return
+                self._ponder_result = (key, d, move)
+                if not self.heuristic_leaf or abs(score) > PROVEN_SCORE:
+                    return
+        except Timeout:
+            pass
+
+    def stop_pondering(self):
+        """Stop the background search started after the last move, if any."""
+        if self._ponder_thread is not None:
+            self._ponder_stop.set()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+
+    def _search(self, game, legal_moves):
+        """Run the fixed-depth or iterative deepening search configured for
+        this player and return the best move found before the timeout.
+        """
         # Return (-1, -1) when there are no available moves
         if not legal_moves or len(legal_moves) == 0:
             return (-1, -1)
@@ -205,21 +991,58 @@ class CustomPlayer:
             # moves, so quickly return the first one
             return legal_moves[0]
 
+        if self.opening_table is not None:
+            move = self._solved_move(game, legal_moves)
+            if move is not None:
+                return move
+
         if self.method == 'minimax':
             method = self.minimax
         else:
             method = self.alphabeta
 
         move = legal_moves[0]
+        first_depth = 1
+        if self._ponder_result is not None:
+            # Resume after the deepest pondered iteration if the opponent
+            # played the predicted reply
+            key, depth, pondered_move = self._ponder_result
+            self._ponder_result = None
+            if pondered_move in legal_moves and key == game.position_key():
+                move = pondered_move
+                first_depth = depth + 1
+
+        if self.tt is not None and self.method != 'minimax':
+            # Start after the deepest result already stored for the root
+            entry = self._probe(game)[1]
+            if entry is not None and entry[3] in legal_moves:
+                depth = entry[0] + 1 if entry[2] == EXACT else entry[0]
+                if depth > first_depth:
+                    move = entry[3]
+                    first_depth = depth
+
+        manager = self.time_manager
         try:
             # Iterative deepening or fixed depth below
             if self.iterative:
-                for d in range(1, 99):
+                if manager is not None: manager.start(self.time_left)
+                for d in range(first_depth, 99):
+                    self.heuristic_leaf = False
                     score, move_returned = method(game, d)
                     if move_returned != (-1, -1): move = move_returned
+                    if self.stats is not None: self.stats.depth = d
+                    # Deeper searches can't change a proven result, and
+                    # if no leaf was scored heuristically the tree is exhausted
+                    if not self.heuristic_leaf or abs(score) > PROVEN_SCORE:
+                        break
+                    # Don't start an iteration that can't finish in time
+                    if manager is not None and not manager.should_continue(
+                            manager.record(move, self.time_left), self.TIMER_THRESHOLD):
+                        break
             else:
                 score, move_returned = method(game, self.search_depth)
                 if move_returned != (-1, -1): move = move_returned
+                if self.stats is not None: self.stats.depth = self.search_depth
 
 
         except Timeout:
@@ -229,6 +1052,44 @@ class CustomPlayer:
         # Return the best move from the last completed search iteration
         return move
 
+    def _solved_move(self, game, legal_moves):
+        """Return a move into a position the opening table proves lost for
+        the opponent, or None if the table doesn't decide this position.
+        """
+        table = self.opening_table.get((game.width, game.height))
+        if table is None:
+            return None
+        for move in legal_moves:
+            if table.get(canonical_key(game.forecast_move(move))) is False:
+                return move
+        return None
+
+    def _check_time(self):
+        """Read the clock, raise `Timeout` if the search must stop, and
+        schedule the next clock read according to `self.poll_interval`.
+        """
+        remaining = self.time_left()
+        slack = remaining - self.TIMER_THRESHOLD
+        if slack < 0:
+            raise Timeout()
+
+        interval = self.poll_interval
+        if interval == 'auto':
+            interval = 1
+            if self._last_poll is not None:
+                nodes, last_remaining = self._last_poll
+                elapsed = last_remaining - remaining
+                if elapsed > 0:
+                    # nodes per ms, projected over the smaller of the target
+                    # polling interval and half of the time left
+                    rate = (self.nodes_searched - nodes) / elapsed
+                    interval = max(1, int(rate * min(POLL_MILLIS, slack / 2)))
+                else:
+                    # the clock hasn't visibly advanced; back off gradually
+                    interval = 2 * max(1, self._next_poll - nodes)
+            self._last_poll = (self.nodes_searched, remaining)
+        self._next_poll = self.nodes_searched + interval
+
     def minimax(self, game, depth, maximizing_player=True):
         """Implement the minimax search algorithm as described in the lectures.
 
@@ -255,23 +1116,35 @@ class CustomPlayer:
             The best move for the current branch; (-1, -1) for no legal moves
         """
 
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise Timeout()
+        self.nodes_searched += 1
+        if self.nodes_searched >= self._next_poll:
+            self._check_time()
 
         if depth == 0:
             raise ValueError("depth must be strictly greater than zero.")
 
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+
         # If we are at a leaf that is a win for a player, return the score
         moves = [move for move in game.get_legal_moves()]
         if not moves or len(moves) == 0:
-            return self.score(game, self), (-1, -1)
+            if stats is not None: stats.leaves += 1
+            return self._evaluate(game), (-1, -1)
 
         # For a fixed depth of 1, we just return the score for each move.
         # For a deeper depth, we recurse by expanding each leaf
         move_score_pairs = None
         if depth == 1:
-            move_score_pairs = [(self.score(game.forecast_move(move), self), move) \
-                                for move in moves]
+            if stats is not None: stats.leaves += len(moves)
+            batch = getattr(self.score, 'batch', None)
+            if batch is not None:
+                move_score_pairs = list(zip(self._leaf_values(batch(game, moves, self),
+                                                              game.move_count + 1), moves))
+            else:
+                move_score_pairs = [(self._evaluate(game.forecast_move(move)), move) \
+                                    for move in moves]
         else:
             move_score_pairs = [(self.minimax(game.forecast_move(move), depth-1, not maximizing_player)[0], \
                                  move) for move in moves]
@@ -315,23 +1188,61 @@ class CustomPlayer:
         """
 
 
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise Timeout()
+        self.nodes_searched += 1
+        if self.nodes_searched >= self._next_poll:
+            self._check_time()
 
         if depth == 0:
             raise ValueError("depth must be strictly greater than zero.")
 
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+
         moves = game.get_legal_moves()
         if not moves or len(moves) == 0:
-            return self.score(game, self), (-1, -1)
+            if stats is not None: stats.leaves += 1
+            return self._evaluate(game), (-1, -1)
+
+        tt = self.tt
+        if tt is not None:
+            key, entry, transform = self._probe(game)
+            if stats is not None:
+                stats.tt_probes += 1
+                if entry is not None: stats.tt_hits += 1
+            if entry is not None:
+                tt_depth, tt_val, tt_flag, tt_move = entry
+                if tt_depth >= depth and (tt_flag == EXACT or
+                                          (tt_flag == LOWER and tt_val >= beta) or
+                                          (tt_flag == UPPER and tt_val <= alpha)):
+                    if abs(tt_val) < PROVEN_SCORE:
+                        self.heuristic_leaf = True
+                    return tt_val, tt_move
+            moves = self._order_moves(moves, entry, maximizing_player)
+            alpha_orig, beta_orig = alpha, beta
+
+        # Score all children of a frontier node at once if the heuristic
+        # has a batched implementation
+        batch_scores = None
+        if depth == 1:
+            batch = getattr(self.score, 'batch', None)
+            if batch is not None:
+                batch_scores = self._leaf_values(batch(game, moves, self),
+                                                 game.move_count + 1)
 
         move_to_return = moves[0]
         if maximizing_player:
             val = float("-inf")
 
-            for move in moves:
+            for idx, move in enumerate(moves):
                 if depth == 1:
-                    newval = self.score(game.forecast_move(move), self)
+                    if stats is not None: stats.leaves += 1
+                    if batch_scores is not None:
+                        newval = batch_scores[idx]
+                    else:
+                        newval = self._evaluate(game.forecast_move(move))
+                elif self.lmr or self.futility_margin is not None:
+                    newval = self._selective(game.forecast_move(move), idx, depth, alpha, beta, maximizing_player)
                 else:
                     newval = self.alphabeta(game.forecast_move(move), depth-1, alpha, beta, not maximizing_player)[0]
                 # Check if the newval is more than the stored val
@@ -341,13 +1252,21 @@ class CustomPlayer:
                     move_to_return = move
                 # If we have a new max, update beta
                 if val >= beta:
+                    if stats is not None: stats.cutoffs[idx] += 1
+                    if tt is not None: self._store(key, depth, val, alpha_orig, beta_orig, move, maximizing_player, transform)
                     return val, move
                 alpha = max(alpha, val)
         else:
             val = float("inf")
-            for move in moves:
+            for idx, move in enumerate(moves):
                 if depth == 1:
-                    newval = self.score(game.forecast_move(move), self)
+                    if stats is not None: stats.leaves += 1
+                    if batch_scores is not None:
+                        newval = batch_scores[idx]
+                    else:
+                        newval = self._evaluate(game.forecast_move(move))
+                elif self.lmr or self.futility_margin is not None:
+                    newval = self._selective(game.forecast_move(move), idx, depth, alpha, beta, maximizing_player)
                 else:
                     newval = self.alphabeta(game.forecast_move(move), depth-1, alpha, beta, not maximizing_player)[0]
                 # Check if the newval is less than the stored val
@@ -357,6 +1276,121 @@ class CustomPlayer:
                     move_to_return = move
                 # If we have a new min, update alpha
                 if val <= alpha:
+                    if stats is not None: stats.cutoffs[idx] += 1
+                    if tt is not None: self._store(key, depth, val, alpha_orig, beta_orig, move, maximizing_player, transform)
                     return val, move
                 beta = min(beta, val)
+        if tt is not None: self._store(key, depth, val, alpha_orig, beta_orig, move_to_return, maximizing_player, transform)
         return val, move_to_return
+
+    def _selective(self, child, idx, depth, alpha, beta, maximizing_player):
+        """Return the value of `child`, the position after the move at index
+        `idx` of an alphabeta node searched to `depth`, applying futility
+        pruning and late move reductions when they are enabled.
+        """
+        stats = self.stats
+        margin = self.futility_margin
+        if margin is not None and depth == 2:
+            static = self._evaluate(child)
+            if (static + margin <= alpha) if maximizing_player else (static - margin >= beta):
+                if stats is not None: stats.futility_prunes += 1
+                return static
+
+        if self.lmr and depth >= self.lmr_min_depth and idx >= self.lmr_full_moves:
+            if stats is not None: stats.reductions += 1
+            # the reduced search only has to tell whether the move improves on
+            # the bound, so it gets a null window around it (zero-width, as the
+            # cutoff tests are inclusive and the scores are not integers)
+            bound = alpha if maximizing_player else beta
+            reduced = max(depth - 1 - self.lmr_reduction, 1)
+            val = self.alphabeta(child, reduced, bound, bound, not maximizing_player)[0]
+            if (val <= alpha) if maximizing_player else (val >= beta):
+                return val
+            if stats is not None: stats.researches += 1
+
+        return self.alphabeta(child, depth - 1, alpha, beta, not maximizing_player)[0]
+
+    def _evaluate(self, game):
+        """Score a leaf of the search. Wins and losses reported by the score
+        function as +/-inf are converted to distance-aware proven values;
+        any other value marks the search result as heuristic.
+        """
+        val = self.score(game, self)
+        if val == float("inf"):
+            return WIN_SCORE - game.move_count
+        if val == float("-inf"):
+            return game.move_count - WIN_SCORE
+        self.heuristic_leaf = True
+        return val
+
+    def _leaf_values(self, scores, move_count):
+        """Apply the conversion of `_evaluate` to a list of scores of
+        positions reached after `move_count` moves.
+        """
+        values = []
+        for val in scores:
+            if val == float("inf"):
+                val = WIN_SCORE - move_count
+            elif val == float("-inf"):
+                val = move_count - WIN_SCORE
+            else:
+                self.heuristic_leaf = True
+            values.append(val)
+        return values
+
+    def _order_moves(self, moves, entry, maximizing_player):
+        """Order moves for alpha-beta: the transposition table move first,
+        then by the history score of the side to move.
+        """
+        history = self.history
+        moves = sorted(moves, key=lambda m: history.get((maximizing_player, m), 0),
+                       reverse=True)
+        if entry is not None and entry[3] in moves:
+            moves.remove(entry[3])
+            moves.insert(0, entry[3])
+        return moves
+
+    def _probe(self, game):
+        """Look up `game` in the transposition table.
+
+        Returns
+        ----------
+        (hashable, tuple or None, tuple or None)
+            The table key of the position, its entry with the best move
+            mapped onto `game` (or None), and the `Symmetries` and index of
+            the transform from `game` to the keyed position (None if the
+            position is keyed as is).
+        """
+        if game.move_count >= self.symmetry_plies:
+            key = game.position_key()
+            return key, self.tt.get(key), None
+        sym = symmetries(game.width, game.height)
+        key, index = sym.canonical_transform(*bit_key(game))
+        entry = self.tt.get(key)
+        if not index:
+            return key, entry, None
+        if entry is not None:
+            entry = entry[:3] + (sym.restore_move(index, entry[3]),)
+        return key, entry, (sym, index)
+
+    def _store(self, key, depth, val, alpha, beta, move, maximizing_player, transform=None):
+        """Store a search result in the transposition table, flagged as a
+        bound if it fell outside the (alpha, beta) window it was searched
+        with. If the node was cut off (a fail-high at a max node or a
+        fail-low at a min node), credit the refuting move in the history
+        table of the side that played it. `transform` is the symmetry
+        transform returned by `_probe` for the position.
+        """
+        if val <= alpha:
+            flag = UPPER
+        elif val >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if flag == (LOWER if maximizing_player else UPPER):
+            side_move = (maximizing_player, move)
+            self.history[side_move] = self.history.get(side_move, 0) + depth * depth
+        if transform is not None:
+            sym, index = transform
+            move = sym.transform_move(index, move)
+        self.tt[key] = (depth, val, flag, move)
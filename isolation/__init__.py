@@ -11,6 +11,11 @@ import io
 
 # Make the Board class available at the root of the module for imports
 from .isolation import Board
+from .isolation import MobilityBoard
+from .isolation import NodeClock
+from .isolation import encode_move
+from .isolation import decode_move
+from .compact import CompactBoard
 
 
 def game_as_text(winner, move_history, termination="", board=Board(1, 2)):
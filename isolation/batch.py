@@ -0,0 +1,337 @@
+"""
+Lockstep engine for playing many games of Isolation at once, for self-play
+data generation and Monte Carlo rollouts.
+
+`BatchBoard` holds N games as stacked NumPy arrays (a boolean row of blank
+cells per game, the cell index of each player, whose turn it is) and
+advances every unfinished game by one ply per call to `apply_moves`. Legal
+moves come from a knight adjacency matrix with an extra all-True row for
+players that haven't moved, so a location of -1 needs no special case:
+
+    legal = moves_from[location] & blank
+
+and the mobility of both players after every move of every game is one
+matrix product (see `BatchBoard.child_mobility`).
+
+Agents are policies: callables `policy(batch, rows, rng)` that return a cell
+index for each game selected by the boolean mask `rows`. This module
+provides random, greedy, two-ply and rollout policies; `BatchBoard.play`
+runs a pair of them until every game is over. NumPy is required.
+"""
+
+import numpy as np
+
+from .isolation import PACKED_HEADER
+from .isolation import packed_mask_size
+from .vectorized import knight_adjacency
+
+_MOVES_FROM = {}
+
+
+def moves_from(width, height):
+    """Return the (cells + 1, cells) boolean matrix whose row a marks the
+    cells a knight's move away from cell a; the last row, selected by the
+    location -1 of a player that hasn't moved, is all True."""
+    key = (width, height)
+    if key not in _MOVES_FROM:
+        adjacency = knight_adjacency(width, height).astype(bool)
+        _MOVES_FROM[key] = np.vstack([adjacency, np.ones((1, width * height), dtype=bool)])
+    return _MOVES_FROM[key]
+
+
+class BatchBoard(object):
+    """
+    A batch of games on boards of the same size, all starting empty.
+
+    Parameters
+    ----------
+    count : int
+        Number of games.
+
+    width, height : int (optional)
+        Size of the boards.
+
+    Attributes
+    ----------
+    blank : numpy.ndarray
+        (count, cells) booleans, True for the blank cells of each game.
+        Cells are indexed row-major, i.e., `row * width + col`.
+
+    locations : numpy.ndarray
+        (count, 2) cell indices of player 1 and player 2 (-1 if they haven't
+        moved yet).
+
+    to_move : numpy.ndarray
+        Index (0 or 1) of the player to move in each game.
+
+    move_count : numpy.ndarray
+        Number of plies played in each game.
+
+    history : numpy.ndarray
+        (count, cells) cells moved to at each ply of each game, -1 past the
+        end of the game.
+
+    winner : numpy.ndarray
+        Index of the winner of each game, -1 while the game is going on.
+
+    legal : numpy.ndarray
+        (count, cells) booleans, True for the legal moves of the player to
+        move in each game; all False in finished games.
+    """
+
+    def __init__(self, count, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.count = count
+        cells = width * height
+        self.blank = np.ones((count, cells), dtype=bool)
+        self.locations = np.full((count, 2), -1, dtype=np.int64)
+        self.to_move = np.zeros(count, dtype=np.int64)
+        self.move_count = np.zeros(count, dtype=np.int64)
+        self.history = np.full((count, cells), -1, dtype=np.int16)
+        self.winner = np.full(count, -1, dtype=np.int64)
+        self._refresh()
+
+    @property
+    def active(self):
+        """Boolean mask of the games that are not over."""
+        return self.winner < 0
+
+    def _refresh(self):
+        """Compute the legal moves of the player to move and end the games
+        where there are none."""
+        rows = np.arange(self.count)
+        location = self.locations[rows, self.to_move]
+        legal = moves_from(self.width, self.height)[location] & self.blank
+        legal &= self.active[:, None]
+        stuck = self.active & ~legal.any(axis=1)
+        self.winner[stuck] = 1 - self.to_move[stuck]
+        self.legal = legal
+
+    def apply_moves(self, cells):
+        """
+        Advance the games by one ply.
+
+        Parameters
+        ----------
+        cells : array-like
+            The cell index to move to in each game; entries for finished
+            games are ignored (-1 by convention).
+
+        Raises
+        ----------
+        ValueError
+            If the cell given for an unfinished game isn't a legal move.
+        """
+        rows = np.flatnonzero(self.active)
+        cells = np.asarray(cells, dtype=np.int64)[rows]
+        if not self.legal[rows, cells].all():
+            raise ValueError("illegal move in game {}".format(
+                rows[~self.legal[rows, cells]][0]))
+        self.blank[rows, cells] = False
+        self.locations[rows, self.to_move[rows]] = cells
+        self.history[rows, self.move_count[rows]] = cells
+        self.move_count[rows] += 1
+        self.to_move[rows] ^= 1
+        self._refresh()
+
+    def mobility(self, rows=None):
+        """Return the number of legal moves of the player to move and of the
+        other player in each game (or in the games selected by `rows`)."""
+        if rows is None:
+            rows = np.ones(self.count, dtype=bool)
+        table = moves_from(self.width, self.height)
+        blank = self.blank[rows]
+        other = self.locations[rows, 1 - self.to_move[rows]]
+        return self.legal[rows].sum(axis=1), (table[other] & blank).sum(axis=1)
+
+    def child_mobility(self, rows=None):
+        """
+        Count the legal moves of both players in the position after each
+        move, for every game (or the games selected by `rows`).
+
+        Returns
+        ----------
+        (numpy.ndarray, numpy.ndarray)
+            (games, cells) counts for the player who moved (the player to
+            move now) and for the other player, in the position after moving
+            to each cell. Entries for cells that aren't legal moves are
+            meaningless.
+        """
+        if rows is None:
+            rows = np.ones(self.count, dtype=bool)
+        table = moves_from(self.width, self.height)
+        blank = self.blank[rows].astype(np.int32)
+        # the destination cell becomes blocked, but it is never a knight's
+        # move away from itself, so the mover's count is unaffected by it
+        mover = blank.dot(knight_adjacency(self.width, self.height))
+        reach = table[self.locations[rows, 1 - self.to_move[rows]]].astype(np.int32)
+        other = (reach * blank).sum(axis=1)[:, None] - reach
+        return mover, other
+
+    def take(self, games):
+        """Return a new batch holding copies of the given games (indices,
+        which may repeat, or a boolean mask)."""
+        batch = type(self).__new__(type(self))
+        batch.width, batch.height = self.width, self.height
+        for name in ("blank", "locations", "to_move", "move_count", "history",
+                     "winner", "legal"):
+            setattr(batch, name, getattr(self, name)[games].copy())
+        batch.count = len(batch.winner)
+        return batch
+
+    def play(self, player_1, player_2, rng=None):
+        """
+        Play every game to the end, moving with policy `player_1` for the
+        first player and `player_2` for the second.
+
+        Parameters
+        ----------
+        player_1, player_2 : callable
+            Policies, called as `policy(batch, rows, rng)` where `rows` is a
+            boolean mask of the games where that player is to move; they
+            return the cell to move to in each of those games.
+
+        rng : `numpy.random.Generator` or int (optional)
+            Random number generator (or seed) passed to the policies.
+
+        Returns
+        ----------
+        numpy.ndarray
+            The index of the winner of each game.
+        """
+        rng = np.random.default_rng(rng)
+        policies = (player_1, player_2)
+        while self.active.any():
+            cells = np.full(self.count, -1, dtype=np.int64)
+            for index, policy in enumerate(policies):
+                rows = self.active & (self.to_move == index)
+                if rows.any():
+                    cells[rows] = policy(self, rows, rng)
+            self.apply_moves(cells)
+        return self.winner
+
+    def to_bytes(self):
+        """Encode the games in the format of `isolation.Board.batch_to_bytes`,
+        so that they can be decoded with `Board.batch_from_bytes`."""
+        masks = np.packbits(~self.blank, axis=1, bitorder="little")
+        size = packed_mask_size(self.width, self.height)
+        return b"".join(
+            PACKED_HEADER.pack(self.width, self.height, int(self.move_count[i]),
+                               int(self.locations[i, 0]), int(self.locations[i, 1]),
+                               int(self.to_move[i])) + masks[i, :size].tobytes()
+            for i in range(self.count))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Create a batch from `Board.to_bytes` encodings of positions on
+        boards of the same size, concatenated as by `Board.batch_to_bytes`.
+        The `history` entries of the plies before the encoded positions are
+        -1.
+        """
+        width, height = PACKED_HEADER.unpack_from(data, 0)[:2]
+        record = PACKED_HEADER.size + packed_mask_size(width, height)
+        count = len(data) // record
+        batch = cls(0, width, height)
+        batch.count = count
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(count, record)
+        headers = [PACKED_HEADER.unpack_from(data, i * record) for i in range(count)]
+        if any(h[:2] != (width, height) for h in headers):
+            raise ValueError("boards in a batch must have the same size")
+        mask = np.unpackbits(raw[:, PACKED_HEADER.size:], axis=1, bitorder="little")
+        batch.blank = mask[:, :width * height] == 0
+        batch.locations = np.array([h[3:5] for h in headers], dtype=np.int64).reshape(count, 2)
+        batch.to_move = np.array([h[5] for h in headers], dtype=np.int64)
+        batch.move_count = np.array([h[2] for h in headers], dtype=np.int64)
+        batch.history = np.full((count, width * height), -1, dtype=np.int16)
+        batch.winner = np.full(count, -1, dtype=np.int64)
+        batch._refresh()
+        return batch
+
+    @classmethod
+    def from_board(cls, game, count=1):
+        """Create a batch of `count` copies of the position of an
+        `isolation.Board`."""
+        return cls.from_bytes(game.to_bytes() * count)
+
+
+def choose(scores, legal, rng):
+    """Return the index of the highest scoring legal cell in each row of
+    `scores`, breaking ties at random."""
+    scores = np.where(legal, scores, -np.inf)
+    ties = legal & (scores == scores.max(axis=1, keepdims=True))
+    return np.where(ties, rng.random(ties.shape), -1.).argmax(axis=1)
+
+
+def open_move_scores(batch, rows):
+    """Batched `sample_players.open_move_score` of the position after each
+    move, for the player who moves."""
+    mover, other = batch.child_mobility(rows)
+    return np.where(other == 0, np.inf, mover)
+
+
+def improved_scores(batch, rows):
+    """Batched `sample_players.improved_score` of the position after each
+    move, for the player who moves."""
+    mover, other = batch.child_mobility(rows)
+    return np.where(other == 0, np.inf, mover - other)
+
+
+def random_policy(batch, rows, rng):
+    """Move at random."""
+    legal = batch.legal[rows]
+    return choose(np.zeros(legal.shape), legal, rng)
+
+
+def greedy_policy(score_fn=improved_scores):
+    """Return a policy that makes the move with the best score, like
+    `sample_players.GreedyPlayer`."""
+    def policy(batch, rows, rng):
+        return choose(score_fn(batch, rows), batch.legal[rows], rng)
+    return policy
+
+
+def _children(batch, rows):
+    """Return the (game, cell) pairs of the legal moves in the games
+    selected by `rows` (games numbered within the selection), and the
+    batch of positions after each move."""
+    games, cells = np.nonzero(batch.legal[rows])
+    children = batch.take(np.flatnonzero(rows)[games])
+    children.apply_moves(cells)
+    return games, cells, children
+
+
+def two_ply_policy(score_fn=improved_scores):
+    """
+    Return a policy that searches two plies: each move is valued by the
+    best reply of the opponent under `score_fn`, which must be zero-sum
+    (like `improved_scores`) for the opponent's score to be the negation
+    of the mover's.
+    """
+    def policy(batch, rows, rng):
+        games, cells, children = _children(batch, rows)
+        replies = np.where(children.legal,
+                           score_fn(children, np.ones(children.count, dtype=bool)), -np.inf)
+        scores = np.zeros(batch.legal[rows].shape)
+        scores[games, cells] = -replies.max(axis=1)
+        return choose(scores, batch.legal[rows], rng)
+    return policy
+
+
+def rollout_policy(playouts=16, policy=random_policy):
+    """
+    Return a policy that plays `playouts` games after each move, with
+    `policy` moving for both players, and makes the move that wins the
+    most of them.
+    """
+    def rollouts(batch, rows, rng):
+        games, cells, children = _children(batch, rows)
+        mover = batch.to_move[rows][games]
+        children = children.take(np.repeat(np.arange(children.count), playouts))
+        winner = children.play(policy, policy, rng)
+        wins = (winner == np.repeat(mover, playouts)).reshape(-1, playouts).mean(axis=1)
+        scores = np.zeros(batch.legal[rows].shape)
+        scores[games, cells] = wins
+        return choose(scores, batch.legal[rows], rng)
+    return rollouts
@@ -0,0 +1,133 @@
+"""
+Bitmask helpers for knight-move Isolation. A set of cells is represented as
+an int with bit `row * width + col` set for every cell in the set, so whole
+sets of cells can be advanced by a knight's move with a handful of shifts.
+"""
+
+from .isolation import DIRECTIONS
+
+_TABLES = {}
+
+
+class KnightTables(object):
+    """
+    Precomputed masks for a board of the given size.
+
+    Attributes
+    ----------
+    full : int
+        Mask with every cell of the board set.
+
+    attacks : list<int>
+        For each cell, the mask of cells a knight's move away from it.
+
+    shifts : list<(int, int)>
+        For each knight direction, the mask of source cells whose move in
+        that direction stays on the board, and the shift (in bits) to apply.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        self.attacks = [0] * (width * height)
+        for r in range(height):
+            for c in range(width):
+                for dr, dc in DIRECTIONS:
+                    if 0 <= r + dr < height and 0 <= c + dc < width:
+                        self.attacks[r * width + c] |= 1 << ((r + dr) * width + c + dc)
+        self.shifts = []
+        for dr, dc in DIRECTIONS:
+            source = 0
+            for r in range(height):
+                for c in range(width):
+                    if 0 <= r + dr < height and 0 <= c + dc < width:
+                        source |= 1 << (r * width + c)
+            self.shifts.append((source, dr * width + dc))
+
+    def expand(self, cells):
+        """Return the mask of cells a knight's move away from any of `cells`."""
+        out = 0
+        for source, shift in self.shifts:
+            if shift > 0:
+                out |= (cells & source) << shift
+            else:
+                out |= (cells & source) >> -shift
+        return out
+
+
+def knight_tables(width, height):
+    """Return the (cached) `KnightTables` for a board of the given size."""
+    if (width, height) not in _TABLES:
+        _TABLES[(width, height)] = KnightTables(width, height)
+    return _TABLES[(width, height)]
+
+
+if hasattr(int, "bit_count"):
+    def popcount(mask):
+        """Number of cells in `mask`."""
+        return mask.bit_count()
+else:
+    def popcount(mask):
+        """Number of cells in `mask`."""
+        return bin(mask).count("1")
+
+
+def cells(mask):
+    """List the bit indices of the cells in `mask`, lowest first."""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def cell_index(location, width):
+    """Convert a (row, col) location to a bit index."""
+    return location[0] * width + location[1]
+
+
+def blank_mask(game):
+    """Mask of the blank cells of an `isolation.Board`."""
+    return knight_tables(game.width, game.height).full & ~game.position_key()[0]
+
+
+def reachable(tables, start, blank, max_depth=None):
+    """
+    Flood fill the cells a knight can reach from the cell index `start`
+    moving only through `blank` cells.
+
+    Parameters
+    ----------
+    tables : `KnightTables`
+        Tables for the board size.
+
+    start : int or None
+        Bit index of the starting cell; None means a player that hasn't
+        moved yet, who can reach every blank cell.
+
+    blank : int
+        Mask of the blank cells.
+
+    max_depth : int (optional)
+        If given, only cells reachable in at most this many moves are
+        counted.
+
+    Returns
+    ----------
+    int
+        Mask of the reachable cells (not including `start`).
+    """
+    if start is None:
+        return blank
+    seen = 0
+    frontier = tables.attacks[start] & blank
+    depth = 1
+    while frontier:
+        seen |= frontier
+        if max_depth is not None and depth >= max_depth:
+            break
+        frontier = tables.expand(frontier) & blank & ~seen
+        depth += 1
+    return seen
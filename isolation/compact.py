@@ -0,0 +1,242 @@
+"""
+A compact implementation of the Isolation board with the same public API as
+`isolation.Board`.
+
+`Board` keeps its state in a nested list and in dicts keyed by the player
+objects, so every `copy()` rebuilds several containers. `CompactBoard` uses
+`__slots__`, stores the blocked cells in a single `bytearray` indexed
+row-major (`row * width + col`) and the player locations as small ints, so a
+clone is one buffer copy plus a few attribute assignments. It also keeps a
+bitmask of the blocked cells (for `position_key()`) and a bitmask of the
+blank cells in the column-major order of `get_blank_spaces()`, both updated
+by `apply_move()`.
+"""
+
+from .isolation import Board
+from .isolation import knight_neighbors
+from .isolation import column_major_cells
+from .isolation import mask_cells
+from .isolation import packed_mask_size
+from .isolation import PACKED_HEADER
+
+NOT_MOVED = -1  # location of a player that hasn't moved yet
+
+_COORDINATES = {}
+
+
+def coordinates(width, height):
+    """Return the (cached) list of (row, col) tuples for each cell index, so
+    that move lists can share tuples instead of allocating new ones."""
+    if (width, height) not in _COORDINATES:
+        _COORDINATES[(width, height)] = [(r, c) for r in range(height) for c in range(width)]
+    return _COORDINATES[(width, height)]
+
+
+class CompactBoard(object):
+    """
+    Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, using a compact array-backed representation.
+
+    Takes the same parameters as `isolation.Board`.
+    """
+    __slots__ = ("width", "height", "move_count", "_players", "_active",
+                 "_cells", "_blocked", "_blanks", "_locations", "_neighbors",
+                 "_coordinates", "_blank_order")
+
+    BLANK = Board.BLANK
+    NOT_MOVED = Board.NOT_MOVED
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._players = (player_1, player_2)
+        self._active = 0
+        self._cells = bytearray(width * height)
+        self._blocked = 0
+        self._blanks = (1 << (width * height)) - 1
+        self._locations = (NOT_MOVED, NOT_MOVED)
+        self._neighbors = knight_neighbors(width, height)
+        self._coordinates = coordinates(width, height)
+        self._blank_order = column_major_cells(width, height)
+
+    @property
+    def active_player(self):
+        """
+        The object registered as the player holding initiative in the
+        current game state.
+        """
+        return self._players[self._active]
+
+    @property
+    def inactive_player(self):
+        """
+        The object registered as the player in waiting for the current
+        game state.
+        """
+        return self._players[1 - self._active]
+
+    def _index(self, player):
+        """Return 0 for player 1 and 1 for player 2."""
+        if player == self._players[0]:
+            return 0
+        elif player == self._players[1]:
+            return 1
+        raise RuntimeError("`player` must be an object registered as a player in the current game.")
+
+    def get_opponent(self, player):
+        """
+        Return the opponent of the supplied player; see `Board.get_opponent`.
+        """
+        return self._players[1 - self._index(player)]
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = CompactBoard.__new__(CompactBoard)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.move_count = self.move_count
+        new_board._players = self._players
+        new_board._active = self._active
+        new_board._cells = self._cells[:]
+        new_board._blocked = self._blocked
+        new_board._blanks = self._blanks
+        new_board._locations = self._locations
+        new_board._neighbors = self._neighbors
+        new_board._coordinates = self._coordinates
+        new_board._blank_order = self._blank_order
+        return new_board
+
+    forecast_move = Board.forecast_move
+
+    def move_is_legal(self, move):
+        """
+        Test whether a move is legal in the current game state; see
+        `Board.move_is_legal`.
+        """
+        row, col = move
+        return 0 <= row < self.height and \
+               0 <= col < self.width and \
+               not self._cells[row * self.width + col]
+
+    def get_blank_spaces(self):
+        """
+        Return a list of the locations that are still available on the board.
+        """
+        return mask_cells(self._blanks, self._blank_order)
+
+    def get_player_location(self, player):
+        """
+        Find the current location of the specified player on the board; see
+        `Board.get_player_location`.
+        """
+        location = self._locations[self._index(player)]
+        if location == NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._coordinates[location]
+
+    def get_legal_moves(self, player=None):
+        """
+        Return the list of all legal moves for the specified player (the
+        active player if None); see `Board.get_legal_moves`.
+        """
+        index = self._active if player is None else self._index(player)
+        location = self._locations[index]
+        if location == NOT_MOVED:
+            return self.get_blank_spaces()
+        cells, coordinates = self._cells, self._coordinates
+        return [coordinates[cell] for cell in self._neighbors[location] if not cells[cell]]
+
+    def mobility(self, player=None):
+        """
+        Return the number of legal moves for the specified player (the active
+        player if None).
+        """
+        index = self._active if player is None else self._index(player)
+        location = self._locations[index]
+        cells = self._cells
+        if location == NOT_MOVED:
+            return len(cells) - self.move_count
+        return sum(1 for cell in self._neighbors[location] if not cells[cell])
+
+    def apply_move(self, move):
+        """
+        Move the active player to a specified location; see
+        `Board.apply_move`.
+        """
+        cell = move[0] * self.width + move[1]
+        self._cells[cell] = self._active + 1
+        self._blocked |= 1 << cell
+        self._blanks &= ~(1 << (move[1] * self.height + move[0]))
+        if self._active:
+            self._locations = (self._locations[0], cell)
+        else:
+            self._locations = (cell, self._locations[1])
+        self._active = 1 - self._active
+        self.move_count += 1
+
+    is_winner = Board.is_winner
+    is_loser = Board.is_loser
+    utility = Board.utility
+
+    def position_key(self):
+        """
+        Return a hashable key identifying the current game state, in the same
+        format as `Board.position_key`.
+        """
+        return (self._blocked,) + self._locations
+
+    def to_bytes(self):
+        """
+        Encode the game state in the compact binary form of
+        `Board.to_bytes`.
+        """
+        return PACKED_HEADER.pack(self.width, self.height, self.move_count,
+                                  self._locations[0], self._locations[1], self._active) + \
+            self._blocked.to_bytes(packed_mask_size(self.width, self.height), "little")
+
+    from_bytes = classmethod(Board.from_bytes.__func__)
+    batch_to_bytes = staticmethod(Board.batch_to_bytes)
+    batch_from_bytes = classmethod(Board.batch_from_bytes.__func__)
+    _unpack = classmethod(Board._unpack.__func__)
+
+    def _load(self, mask, p1, p2, move_count, second):
+        """Set the state of a new board from its decoded fields."""
+        cells = self._cells
+        for cell in range(len(cells)):
+            if mask >> cell & 1:
+                cells[cell] = 1
+                row, col = self._coordinates[cell]
+                self._blanks &= ~(1 << (col * self.height + row))
+        if p2 >= 0:
+            cells[p2] = 2
+        self._blocked = mask
+        self._locations = (p1, p2)
+        self.move_count = move_count
+        self._active = second
+
+    print_board = Board.print_board
+
+    def to_string(self):
+        """Generate a string representation of the current game state; see
+        `Board.to_string`.
+        """
+        p1_loc, p2_loc = self._locations
+        out = ''
+        for i in range(self.height):
+            out += ' | '
+            for j in range(self.width):
+                cell = i * self.width + j
+                if not self._cells[cell]:
+                    out += ' '
+                elif cell == p1_loc:
+                    out += '1'
+                elif cell == p2_loc:
+                    out += '2'
+                else:
+                    out += '-'
+                out += ' | '
+            out += '\n\r'
+        return out
+
+    play = Board.play
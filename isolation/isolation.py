@@ -8,14 +8,106 @@ remain compatible with the defaults provided, and none of your changes will
 be available to project reviewers.
 """
 
+import struct
 import timeit
 
 from copy import deepcopy
 from copy import copy
+from itertools import compress
 
 
 TIME_LIMIT_MILLIS = 200
 
+# Header of the `Board.to_bytes` encoding: width, height, move count, the
+# cells of player 1 and player 2 (-1 if not moved) and the side to move
+# (0 for player 1), followed by the blocked-cell mask in little-endian order
+PACKED_HEADER = struct.Struct("<BBHhhB")
+
+DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+              (1, -2),  (1, 2), (2, -1),  (2, 1)]
+
+_KNIGHT_NEIGHBORS = {}
+_KNIGHT_MOVES = {}
+_COLUMN_MAJOR = {}
+_BIT_SELECTORS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def knight_neighbors(width, height):
+    """
+    Return a list with an entry for each cell (indexed row-major, i.e.,
+    `row * width + col`) holding the tuple of indices of the cells a knight's
+    move away from it on a board of the given size. Tables are cached.
+    """
+    if (width, height) not in _KNIGHT_NEIGHBORS:
+        _KNIGHT_NEIGHBORS[(width, height)] = [
+            tuple((r + dr) * width + c + dc for dr, dc in DIRECTIONS
+                  if 0 <= r + dr < height and 0 <= c + dc < width)
+            for r in range(height) for c in range(width)]
+    return _KNIGHT_NEIGHBORS[(width, height)]
+
+
+def knight_moves(width, height):
+    """
+    Return a list with an entry for each cell (indexed row-major) holding the
+    tuple of (row, col) moves a knight's move away from it, in the order of
+    `DIRECTIONS`. The move tuples are shared between calls, so generating
+    moves doesn't allocate them. Tables are cached.
+    """
+    if (width, height) not in _KNIGHT_MOVES:
+        coordinates = [(r, c) for r in range(height) for c in range(width)]
+        _KNIGHT_MOVES[(width, height)] = [
+            tuple(coordinates[cell] for cell in cells)
+            for cells in knight_neighbors(width, height)]
+    return _KNIGHT_MOVES[(width, height)]
+
+
+def encode_move(move, width=7):
+    """
+    Encode a (row, col) move as its row-major cell index, `row * width + col`;
+    `Board.NOT_MOVED` is encoded as -1.
+    """
+    return -1 if move is None else move[0] * width + move[1]
+
+
+def decode_move(cell, width=7):
+    """Decode a cell index produced by `encode_move`."""
+    return None if cell < 0 else (cell // width, cell % width)
+
+
+def packed_mask_size(width, height):
+    """Number of bytes of blocked-cell mask in `Board.to_bytes` encodings."""
+    return (width * height + 7) // 8
+
+
+def column_major_cells(width, height):
+    """
+    Return the list of (row, col) locations of a board of the given size in
+    the order `Board.get_blank_spaces` lists them (column by column). The
+    entry for a location is at index `col * height + row`. Tables are cached.
+    """
+    if (width, height) not in _COLUMN_MAJOR:
+        _COLUMN_MAJOR[(width, height)] = [(i, j) for j in range(width) for i in range(height)]
+    return _COLUMN_MAJOR[(width, height)]
+
+
+def mask_cells(mask, cells):
+    """
+    Return the entries of `cells` whose index is set in the bitmask `mask`,
+    lowest index first.
+    """
+    # the binary digits of the mask, lowest first, as a string of 0/1 bytes
+    # that `compress` uses as selectors without a Python-level loop
+    return list(compress(cells, bin(mask)[:1:-1].encode().translate(_BIT_SELECTORS)))
+
+
+def stop_pondering(*players):
+    """Stop the background searches of the players that ponder (those with
+    a `stop_pondering()` method), e.g., at the end of a game."""
+    for player in players:
+        stop = getattr(player, "stop_pondering", None)
+        if stop is not None:
+            stop()
+
 
 class Board(object):
     """
@@ -102,6 +194,87 @@ class Board(object):
         new_board.__board_state__ = deepcopy(self.__board_state__)
         return new_board
 
+    def to_bytes(self):
+        """
+        Encode the game state in a compact, fixed-size binary form for
+        sending to other processes. The players are not included; they are
+        supplied again to `from_bytes`. Which player blocked each cell is not
+        recorded either, since no rule depends on it.
+
+        Returns
+        ----------
+        bytes
+            `PACKED_HEADER` followed by `packed_mask_size(width, height)`
+            bytes of blocked-cell mask.
+        """
+        mask, p1, p2 = self.position_key()
+        second = 0 if self.__active_player__ == self.__player_1__ else 1
+        return PACKED_HEADER.pack(self.width, self.height, self.move_count, p1, p2, second) + \
+            mask.to_bytes(packed_mask_size(self.width, self.height), "little")
+
+    @classmethod
+    def from_bytes(cls, data, player_1, player_2):
+        """
+        Decode a game state encoded by `to_bytes`.
+
+        Parameters
+        ----------
+        data : bytes-like
+            The encoded state.
+
+        player_1, player_2 : object
+            The players to register on the new board.
+
+        Returns
+        ----------
+        `isolation.Board`
+            A new board of this class in the encoded state.
+        """
+        return cls._unpack(data, 0, player_1, player_2)[0]
+
+    @staticmethod
+    def batch_to_bytes(boards):
+        """Encode a sequence of boards into a single buffer, concatenating
+        their `to_bytes` encodings."""
+        return b"".join(board.to_bytes() for board in boards)
+
+    @classmethod
+    def batch_from_bytes(cls, data, player_1, player_2):
+        """Decode every board in a buffer written by `batch_to_bytes`, and
+        return them as a list of boards of this class."""
+        boards = []
+        offset = 0
+        while offset < len(data):
+            board, offset = cls._unpack(data, offset, player_1, player_2)
+            boards.append(board)
+        return boards
+
+    @classmethod
+    def _unpack(cls, data, offset, player_1, player_2):
+        """Decode the board encoded at `offset` in `data`, returning it and
+        the offset of the next encoding."""
+        width, height, move_count, p1, p2, second = PACKED_HEADER.unpack_from(data, offset)
+        offset += PACKED_HEADER.size
+        end = offset + packed_mask_size(width, height)
+        mask = int.from_bytes(data[offset:end], "little")
+        board = cls(player_1, player_2, width=width, height=height)
+        board._load(mask, p1, p2, move_count, second)
+        return board, end
+
+    def _load(self, mask, p1, p2, move_count, second):
+        """Set the state of a new board from its decoded fields."""
+        state = self.__board_state__
+        for cell in range(self.width * self.height):
+            if mask >> cell & 1:
+                state[cell // self.width][cell % self.width] = 1
+        if p2 >= 0:
+            state[p2 // self.width][p2 % self.width] = 2
+        self.__last_player_move__[self.__player_1__] = decode_move(p1, self.width)
+        self.__last_player_move__[self.__player_2__] = decode_move(p2, self.width)
+        self.move_count = move_count
+        if second:
+            self.__active_player__, self.__inactive_player__ = self.__player_2__, self.__player_1__
+
     def forecast_move(self, move):
         """
         Return a deep copy of the current game with an input move applied to
@@ -146,8 +319,33 @@ class Board(object):
         """
         Return a list of the locations that are still available on the board.
         """
-        return [(i, j) for j in range(self.width) for i in range(self.height)
-            if self.__board_state__[i][j] == Board.BLANK]
+        state = self.__board_state__
+        return [cell for cell in column_major_cells(self.width, self.height)
+                if state[cell[0]][cell[1]] == Board.BLANK]
+
+    def position_key(self):
+        """
+        Return a hashable key identifying the current game state.
+
+        Returns
+        ----------
+        (int, int, int)
+            A bitmask of the blocked cells (bit `row * width + col` is set
+            when the cell is blocked) and the locations of player 1 and
+            player 2 encoded as cell indices by `encode_move` (-1 for a
+            player that hasn't moved). The player to move is implied by the
+            number of blocked cells.
+        """
+        mask = 0
+        bit = 1
+        for row in self.__board_state__:
+            for cell in row:
+                if cell:
+                    mask |= bit
+                bit <<= 1
+        return (mask,
+                encode_move(self.__last_player_move__[self.__player_1__], self.width),
+                encode_move(self.__last_player_move__[self.__player_2__], self.width))
 
     def get_player_location(self, player):
         """
@@ -205,13 +403,22 @@ class Board(object):
         self.__active_player__, self.__inactive_player__ = self.__inactive_player__, self.__active_player__
         self.move_count += 1
 
+    def mobility(self, player=None):
+        """
+        Return the number of legal moves for the specified player (the active
+        player if None). Equivalent to `len(self.get_legal_moves(player))`,
+        but subclasses such as `MobilityBoard` answer it without generating
+        the moves.
+        """
+        return len(self.get_legal_moves(player))
+
     def is_winner(self, player):
         """ Test whether the specified player has won the game. """
-        return player == self.inactive_player and not self.get_legal_moves(self.active_player)
+        return player == self.inactive_player and not self.mobility(self.active_player)
 
     def is_loser(self, player):
         """ Test whether the specified player has lost the game. """
-        return player == self.active_player and not self.get_legal_moves(self.active_player)
+        return player == self.active_player and not self.mobility(self.active_player)
 
     def utility(self, player):
         """
@@ -237,7 +444,7 @@ class Board(object):
             otherwise.
         """
 
-        if not self.get_legal_moves(self.active_player):
+        if not self.mobility(self.active_player):
 
             if player == self.inactive_player:
                 return float("inf")
@@ -256,14 +463,9 @@ class Board(object):
         if move == Board.NOT_MOVED:
             return self.get_blank_spaces()
 
-        r, c = move
-
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2),  (1, 2), (2, -1),  (2, 1)]
-
-        valid_moves = [(r+dr,c+dc) for dr, dc in directions if self.move_is_legal((r+dr, c+dc))]
-
-        return valid_moves
+        state = self.__board_state__
+        return [m for m in knight_moves(self.width, self.height)[move[0] * self.width + move[1]]
+                if state[m[0]][m[1]] == Board.BLANK]
 
     def print_board(self):
         """DEPRECATED - use Board.to_string()"""
@@ -299,7 +501,7 @@ class Board(object):
 
         return out
 
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
+    def play(self, time_limit=TIME_LIMIT_MILLIS, clock=None):
         """
         Execute a match between the players by alternately soliciting them
         to select a move and applying it in the game.
@@ -310,25 +512,39 @@ class Board(object):
             The maximum number of milliseconds to allow before timeout
             during each turn.
 
+        clock : `NodeClock` (optional)
+            If given, each turn is timed by the clock's virtual time instead
+            of the wall clock.
+
         Returns
         ----------
         (player, list<[(int, int),]>, str)
             Return multiple including the winning player, the complete game
             move history, and a string indicating the reason for losing
             (e.g., timeout or invalid move).
+
+        Players with a `stop_pondering()` method (see
+        `game_agent.CustomPlayer`) have it called when the game ends, so
+        that no background search outlives the game.
         """
         move_history = []
 
         curr_time_millis = lambda: 1000 * timeit.default_timer()
 
+        # player 1 holds initiative after an even number of moves
+        player_1 = self.active_player if self.move_count % 2 == 0 else self.inactive_player
+
         while True:
 
             legal_player_moves = self.get_legal_moves()
 
             game_copy = self.copy()
 
-            move_start = curr_time_millis()
-            time_left = lambda : time_limit - (curr_time_millis() - move_start)
+            if clock is None:
+                move_start = curr_time_millis()
+                time_left = lambda : time_limit - (curr_time_millis() - move_start)
+            else:
+                time_left = clock.timer(self.active_player, time_limit)
             curr_move = self.active_player.get_move(game_copy, legal_player_moves, time_left)
             move_end = time_left()
 
@@ -337,15 +553,173 @@ class Board(object):
             if curr_move is None:
                 curr_move = Board.NOT_MOVED
 
-            if self.active_player == self.__player_1__:
+            if self.active_player == player_1:
                 move_history.append([curr_move])
             else:
                 move_history[-1].append(curr_move)
 
             if move_end < 0:
-                return self.__inactive_player__, move_history, "timeout"
+                stop_pondering(self.active_player, self.inactive_player)
+                return self.inactive_player, move_history, "timeout"
 
             if curr_move not in legal_player_moves:
-                return self.__inactive_player__, move_history, "illegal move"
+                stop_pondering(self.active_player, self.inactive_player)
+                return self.inactive_player, move_history, "illegal move"
 
             self.apply_move(curr_move)
+
+
+class NodeClock(object):
+    """
+    Virtual clock for `Board.play` that charges each player for the search
+    nodes it visits rather than for elapsed time, so that games don't depend
+    on the speed or load of the machine and can be run in parallel on any
+    number of workers. A player's `time_left()` decreases by one millisecond
+    for every `nodes_per_ms` nodes added to its `nodes_searched` counter
+    during the turn.
+
+    Players without a `nodes_searched` counter see a clock that doesn't
+    advance, and players that also read the wall clock (e.g., while
+    pondering) are not deterministic.
+
+    Parameters
+    ----------
+    nodes_per_ms : float
+        Search speed the time limit is converted at, usually calibrated on
+        the machine the agents are meant to run on.
+    """
+
+    def __init__(self, nodes_per_ms):
+        self.nodes_per_ms = nodes_per_ms
+
+    def timer(self, player, time_limit):
+        """Return a `time_left` function for a turn of `player` starting now."""
+        start = getattr(player, "nodes_searched", 0)
+        nodes_per_ms = self.nodes_per_ms
+        return lambda: time_limit - (getattr(player, "nodes_searched", 0) - start) / nodes_per_ms
+
+
+class MobilityBoard(Board):
+    """
+    A `Board` that maintains, for every cell, the number of blank cells a
+    knight's move away from it, so that `mobility()` is O(1) instead of
+    generating the list of legal moves. It also keeps a bitmask of the blank
+    cells (bit `col * height + row`), so `get_blank_spaces()` takes time
+    proportional to the number of blank cells, and the row-major mask of the
+    blocked cells, so `position_key()` is O(1). All are updated incrementally
+    by `apply_move()` and `undo_move()`.
+
+    Takes the same parameters as `Board`.
+    """
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        super(MobilityBoard, self).__init__(player_1, player_2, width=width, height=height)
+        self.__neighbors__ = knight_neighbors(width, height)
+        self.__open_neighbors__ = [len(cells) for cells in self.__neighbors__]
+        self.__blank_count__ = width * height
+        self.__blank_mask__ = (1 << (width * height)) - 1
+        self.__blocked_mask__ = 0
+        # previous locations of the movers, as an immutable linked list of
+        # (location, rest) pairs that copies can share
+        self.__move_stack__ = None
+
+    def copy(self):
+        """
+        Return a deep copy of the current board. The copy is built without
+        running `__init__`: it shares the immutable state (the neighbor
+        table, player symbols and move stack) and copies only the grid, the
+        player locations and the open neighbor counts.
+        """
+        new_board = object.__new__(type(self))
+        new_board.__dict__.update(self.__dict__)
+        new_board.__last_player_move__ = self.__last_player_move__.copy()
+        new_board.__board_state__ = [row[:] for row in self.__board_state__]
+        new_board.__open_neighbors__ = self.__open_neighbors__[:]
+        return new_board
+
+    def mobility(self, player=None):
+        """
+        Return the number of legal moves for the specified player (the active
+        player if None) in constant time.
+        """
+        if player is None:
+            player = self.active_player
+        location = self.__last_player_move__[player]
+        if location == Board.NOT_MOVED:
+            return self.__blank_count__
+        return self.__open_neighbors__[location[0] * self.width + location[1]]
+
+    def get_blank_spaces(self):
+        """
+        Return a list of the locations that are still available on the board,
+        in the same order as `Board.get_blank_spaces`.
+        """
+        return mask_cells(self.__blank_mask__, column_major_cells(self.width, self.height))
+
+    def position_key(self):
+        """
+        Return the key of `Board.position_key()` in constant time, from the
+        incrementally maintained mask of the blocked cells.
+        """
+        last = self.__last_player_move__
+        return (self.__blocked_mask__,
+                encode_move(last[self.__player_1__], self.width),
+                encode_move(last[self.__player_2__], self.width))
+
+    def apply_move(self, move):
+        """
+        Move the active player to a specified location, updating the open
+        neighbor counts of the cells around it.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        ----------
+        None
+        """
+        open_neighbors = self.__open_neighbors__
+        for cell in self.__neighbors__[move[0] * self.width + move[1]]:
+            open_neighbors[cell] -= 1
+        self.__blank_count__ -= 1
+        self.__blank_mask__ &= ~(1 << (move[1] * self.height + move[0]))
+        self.__blocked_mask__ |= 1 << (move[0] * self.width + move[1])
+        self.__move_stack__ = (self.__last_player_move__[self.active_player], self.__move_stack__)
+        super(MobilityBoard, self).apply_move(move)
+
+    def _load(self, mask, p1, p2, move_count, second):
+        """Set the state of a new board from its decoded fields, and compute
+        the open neighbor counts and the blank mask for it. Moves applied
+        before encoding can't be taken back."""
+        super(MobilityBoard, self)._load(mask, p1, p2, move_count, second)
+        blank_mask = 0
+        for cell in range(self.width * self.height):
+            row, col = cell // self.width, cell % self.width
+            if mask >> cell & 1:
+                for neighbor in self.__neighbors__[cell]:
+                    self.__open_neighbors__[neighbor] -= 1
+                self.__blank_count__ -= 1
+            else:
+                blank_mask |= 1 << (col * self.height + row)
+        self.__blank_mask__ = blank_mask
+        self.__blocked_mask__ = mask
+
+    def undo_move(self):
+        """
+        Take back the last move applied to the board, restoring the previous
+        location of the player who made it and the open neighbor counts.
+        """
+        player = self.__inactive_player__
+        row, col = self.__last_player_move__[player]
+        self.__board_state__[row][col] = Board.BLANK
+        for cell in self.__neighbors__[row * self.width + col]:
+            self.__open_neighbors__[cell] += 1
+        self.__blank_count__ += 1
+        self.__blank_mask__ |= 1 << (col * self.height + row)
+        self.__blocked_mask__ &= ~(1 << (row * self.width + col))
+        self.__last_player_move__[player], self.__move_stack__ = self.__move_stack__
+        self.__active_player__, self.__inactive_player__ = player, self.__active_player__
+        self.move_count -= 1
@@ -0,0 +1,142 @@
+"""
+Symmetries of the Isolation board. A knight's move is still a knight's move
+after the board is rotated or reflected, so positions that map onto each
+other under one of these transforms have the same game-theoretic value. A
+square board has eight such transforms (the dihedral group), a rectangular
+board four (identity, both mirror images and the half turn).
+
+Positions are handled in bitmask form, as in `isolation.bitboard`: a mask
+with bit `row * width + col` set for each blocked cell, and player
+locations as cell indices (-1 for a player that hasn't moved yet).
+"""
+
+_SYMMETRIES = {}
+
+CHUNK_BITS = 8
+
+
+class Symmetries(object):
+    """
+    Precomputed cell permutations for the transforms of a board of the given
+    size.
+
+    Attributes
+    ----------
+    permutations : list<list<int>>
+        For each transform (the identity first), the image of every cell
+        index.
+
+    inverses : list<list<int>>
+        The permutations of the inverse transforms.
+
+    chunks : list<list<list<int>>>
+        For each transform and each `CHUNK_BITS`-wide slice of a mask, the
+        transformed mask of every value of the slice, so that a mask can be
+        transformed with one lookup per slice.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        maps = [lambda r, c: (r, c),
+                lambda r, c: (r, width - 1 - c),
+                lambda r, c: (height - 1 - r, c),
+                lambda r, c: (height - 1 - r, width - 1 - c)]
+        if width == height:
+            maps += [lambda r, c: (c, r),
+                     lambda r, c: (c, height - 1 - r),
+                     lambda r, c: (width - 1 - c, r),
+                     lambda r, c: (width - 1 - c, height - 1 - r)]
+        self.permutations = []
+        for fn in maps:
+            perm = []
+            for r in range(height):
+                for c in range(width):
+                    tr, tc = fn(r, c)
+                    perm.append(tr * width + tc)
+            self.permutations.append(perm)
+        self.inverses = []
+        for perm in self.permutations:
+            inverse = [0] * len(perm)
+            for cell, image in enumerate(perm):
+                inverse[image] = cell
+            self.inverses.append(inverse)
+
+        size = width * height
+        self.chunks = []
+        for perm in self.permutations:
+            tables = []
+            for start in range(0, size, CHUNK_BITS):
+                bits = perm[start:start + CHUNK_BITS]
+                table = [0] * (1 << len(bits))
+                for value in range(1, len(table)):
+                    low = value & -value
+                    table[value] = table[value ^ low] | 1 << bits[low.bit_length() - 1]
+                tables.append(table)
+            self.chunks.append(tables)
+
+    def transform_mask(self, index, mask):
+        """Apply transform `index` to a cell mask."""
+        out = 0
+        for table in self.chunks[index]:
+            out |= table[mask & 0xFF]
+            mask >>= CHUNK_BITS
+        return out
+
+    def transform_cell(self, index, cell):
+        """Apply transform `index` to a cell index (-1 is left unchanged)."""
+        return cell if cell < 0 else self.permutations[index][cell]
+
+    def canonical(self, mask, first, second):
+        """
+        Return the smallest image of the position (mask, first, second)
+        under the transforms, which is the same for every position in its
+        symmetry class.
+        """
+        return self.canonical_transform(mask, first, second)[0]
+
+    def canonical_transform(self, mask, first, second):
+        """
+        Return the canonical image of the position (see `canonical`) and the
+        index of a transform that maps the position onto it.
+        """
+        best, best_index = (mask, first, second), 0
+        for index in range(1, len(self.permutations)):
+            perm = self.permutations[index]
+            image = (self.transform_mask(index, mask),
+                     first if first < 0 else perm[first],
+                     second if second < 0 else perm[second])
+            if image < best:
+                best, best_index = image, index
+        return best, best_index
+
+    def transform_move(self, index, move):
+        """Apply transform `index` to a (row, col) move."""
+        cell = self.permutations[index][move[0] * self.width + move[1]]
+        return (cell // self.width, cell % self.width)
+
+    def restore_move(self, index, move):
+        """Apply the inverse of transform `index` to a (row, col) move."""
+        cell = self.inverses[index][move[0] * self.width + move[1]]
+        return (cell // self.width, cell % self.width)
+
+
+def symmetries(width, height):
+    """Return the (cached) `Symmetries` for a board of the given size."""
+    if (width, height) not in _SYMMETRIES:
+        _SYMMETRIES[(width, height)] = Symmetries(width, height)
+    return _SYMMETRIES[(width, height)]
+
+
+def bit_key(game):
+    """
+    Return the position of `game` in bitmask form: the blocked-cell mask and
+    the cell indices of player 1 and player 2 (-1 if they haven't moved).
+    This is the format of `game.position_key()`.
+    """
+    return game.position_key()
+
+
+def canonical_key(game):
+    """Return the canonical bitmask-form key of the position of `game`."""
+    return symmetries(game.width, game.height).canonical(*bit_key(game))
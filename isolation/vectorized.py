@@ -0,0 +1,122 @@
+"""
+Batched evaluation of the positions that follow each legal move, using NumPy
+boolean occupancy vectors and a precomputed knight adjacency matrix.
+
+Search algorithms spend most of their time scoring the children of nodes at
+depth one. Mobility-based heuristics only need the number of legal moves of
+each player in every child, and those counts can be computed for all
+children at once:
+
+    mover[i] = adjacency[moves[i]] . blank
+    other[i] = adjacency[other_loc] . blank - adjacency[other_loc, moves[i]]
+
+A score function declares a batched implementation with the `vectorized`
+decorator; the batched function receives the parent position, the list of
+moves and the scoring player, and returns the list of scores of the children
+in the same order. NumPy is optional -- without it the decorator leaves the
+score function unchanged and searches fall back to scalar evaluation.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+from .isolation import Board
+from .compact import CompactBoard
+
+DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+              (1, -2), (1, 2), (2, -1), (2, 1)]
+
+_ADJACENCY = {}
+
+
+def vectorized(batch_fn):
+    """Decorator attaching `batch_fn` to a score function as its batched
+    implementation (the `batch` attribute), if NumPy is available.
+    """
+    def decorate(score_fn):
+        if np is not None:
+            score_fn.batch = batch_fn
+        return score_fn
+    return decorate
+
+
+def knight_adjacency(width, height):
+    """Return the (cells, cells) boolean matrix whose entry [a, b] is True
+    when cell b is a knight's move away from cell a. Cells are indexed
+    row-major, i.e., `row * width + col`.
+    """
+    key = (width, height)
+    if key not in _ADJACENCY:
+        adjacency = np.zeros((width * height, width * height), dtype=np.int32)
+        for r in range(height):
+            for c in range(width):
+                for dr, dc in DIRECTIONS:
+                    if 0 <= r + dr < height and 0 <= c + dc < width:
+                        adjacency[r * width + c, (r + dr) * width + c + dc] = 1
+        _ADJACENCY[key] = adjacency
+    return _ADJACENCY[key]
+
+
+def blank_vector(game):
+    """Return a flat row-major integer vector with 1 for every blank cell."""
+    if isinstance(game, CompactBoard):
+        return (np.frombuffer(game._cells, dtype=np.uint8) == 0).astype(np.int32)
+    return (np.asarray(game.__board_state__) == Board.BLANK).ravel().astype(np.int32)
+
+
+def batch_mobility(game, moves):
+    """Count the legal moves of both players in each child position.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        The parent position.
+
+    moves : list<(int, int)>
+        Legal moves of the active player in `game`.
+
+    Returns
+    ----------
+    (numpy.ndarray, numpy.ndarray)
+        For each move, the number of legal moves of the player who moved
+        (the active player in `game`) and of the other player, in the
+        position after the move.
+    """
+    width = game.width
+    adjacency = knight_adjacency(width, game.height)
+    blank = blank_vector(game)
+    cells = np.array([r * width + c for r, c in moves])
+
+    # The destination cell becomes blocked, but a cell is never a knight's
+    # move away from itself, so the mover's count is unaffected by it
+    mover = adjacency[cells].dot(blank)
+
+    other_loc = game.get_player_location(game.inactive_player)
+    if other_loc == Board.NOT_MOVED:
+        other = np.full(len(moves), blank.sum() - 1)
+    else:
+        other_cell = other_loc[0] * width + other_loc[1]
+        other = adjacency[other_cell].dot(blank) - adjacency[other_cell, cells]
+    return mover, other
+
+
+def own_and_opponent(game, player, mover, other):
+    """Rearrange the counts returned by `batch_mobility` into the counts for
+    `player` and for its opponent.
+    """
+    if player == game.active_player:
+        return mover, other
+    return other, mover
+
+
+def with_terminal_scores(scores, game, player, other):
+    """Replace the scores of children where the player to move (the
+    inactive player in `game`) has no legal moves with +/-inf, matching the
+    `is_winner`/`is_loser` checks of the scalar score functions, and return
+    them as a list of floats.
+    """
+    scores = scores.astype(float)
+    scores[other == 0] = float("inf") if player == game.active_player else float("-inf")
+    return scores.tolist()
@@ -0,0 +1,438 @@
+"""
+Monte Carlo Tree Search player for knight-move Isolation.
+
+The player uses UCT (upper confidence bounds applied to trees) with the same
+`get_move(game, legal_moves, time_left)` interface as the other agents, so it
+can be dropped into `Board.play()` and the tournament scripts.
+
+`ParallelMCTSPlayer` spreads the playouts over a persistent pool of worker
+processes, either with independent trees per worker (root parallelization)
+or with a single tree in the main process whose leaves are simulated by the
+workers (tree parallelization with virtual loss).
+
+Search states are kept as plain ints instead of `isolation.Board` objects:
+a bitmask of the blank cells and the cell indices of the player to move and
+its opponent (None if that player hasn't moved yet). Applying a move is
+then `(blank ^ (1 << cell), opponent, cell)`, so playouts allocate no board
+copies or move lists. Tree nodes only store the move that leads to them;
+the state of a node is rebuilt from the root while descending.
+"""
+
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from isolation.bitboard import knight_tables
+from isolation.bitboard import popcount
+from isolation.bitboard import cells
+from isolation.bitboard import cell_index
+
+EXPLORATION = math.sqrt(2)  # default UCT exploration constant
+
+
+class MCTSNode(object):
+    """A node of the search tree.
+
+    `wins` counts the playouts won by the player who made `move`, out of the
+    `visits` playouts that passed through the node. `untried` lists the moves
+    from this node that have no child yet. Nodes don't link to their parent,
+    so a discarded tree is freed by reference counting rather than left for
+    the cyclic garbage collector, whose pauses could overrun the deadline.
+    """
+    __slots__ = ("move", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, untried):
+        self.move = move
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.
+
+
+def legal_mask(tables, location, blank):
+    """Mask of the legal moves of a player at `location` (None before its
+    first move)."""
+    if location is None:
+        return blank
+    return tables.attacks[location] & blank
+
+
+def board_state(game):
+    """Return the (blank, to_move, opponent) state of an `isolation.Board`."""
+    tables = knight_tables(game.width, game.height)
+    blank = tables.full & ~game.position_key()[0]
+    locations = []
+    for player in (game.active_player, game.inactive_player):
+        location = game.get_player_location(player)
+        locations.append(None if location is None else cell_index(location, game.width))
+    return blank, locations[0], locations[1]
+
+
+def rollout(tables, blank, to_move, opponent, rng, greedy=False):
+    """Play random moves from a state until a player is stuck.
+
+    With `greedy`, each player instead moves to the cell with the most
+    onward moves, breaking ties at random.
+
+    Returns
+    ----------
+    bool
+        True if the player to move in the given state wins the playout.
+    """
+    attacks = tables.attacks
+    first_to_move = True
+    while True:
+        mask = blank if to_move is None else attacks[to_move] & blank
+        if not mask:
+            return not first_to_move
+        if greedy:
+            best, best_count, ties = None, -1, 0
+            while mask:
+                low = mask & -mask
+                mask ^= low
+                cell = low.bit_length() - 1
+                count = popcount(attacks[cell] & blank)
+                if count > best_count:
+                    best, best_count, ties = cell, count, 1
+                elif count == best_count:
+                    ties += 1
+                    if rng.randrange(ties) == 0:
+                        best = cell
+            cell = best
+        else:
+            for _ in range(rng.randrange(popcount(mask))):
+                mask &= mask - 1
+            cell = (mask & -mask).bit_length() - 1
+        blank ^= 1 << cell
+        to_move, opponent = opponent, cell
+        first_to_move = not first_to_move
+
+
+class MCTSPlayer:
+    """Game-playing agent that chooses a move with Monte Carlo Tree Search.
+
+    Parameters
+    ----------
+    exploration : float (optional)
+        The UCT exploration constant; larger values spread playouts more
+        evenly over the moves.
+
+    timeout : float (optional)
+        Time remaining (in milliseconds) when search is aborted.
+
+    rollout_policy : {'random', 'greedy'} (optional)
+        How moves are chosen during playouts; see `rollout`.
+
+    reuse_tree : boolean (optional)
+        Flag indicating whether to keep the subtree under the actual
+        opponent reply between turns.
+
+    seed : hashable (optional)
+        Seed for the random number generator, for reproducible searches.
+    """
+
+    def __init__(self, exploration=EXPLORATION, timeout=10.,
+                 rollout_policy='random', reuse_tree=True, seed=None):
+        self.exploration = exploration
+        self.TIMER_THRESHOLD = timeout
+        self.greedy = rollout_policy == 'greedy'
+        self.reuse_tree = reuse_tree
+        self.rng = random.Random(seed)
+        self.nodes_searched = 0
+        self.root = None
+        self._root_state = None
+        self._last_move = None
+
+    def get_move(self, game, legal_moves, time_left):
+        """Search for the best move from the available legal moves and return a
+        result before the time limit expires.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        legal_moves : list<(int, int)>
+            A list containing legal moves. Moves are encoded as tuples of pairs
+            of ints defining the next (row, col) for the agent to occupy.
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        ----------
+        (int, int)
+            The most visited move at the root; (-1, -1) if there are no
+            available legal moves.
+        """
+        if not legal_moves:
+            return (-1, -1)
+
+        tables = knight_tables(game.width, game.height)
+        state = board_state(game)
+        root = self._reuse(state) if self.reuse_tree else None
+        # free the rest of the previous tree before starting the clock loop
+        self.root = None
+        if root is None:
+            root = MCTSNode(None, cells(legal_mask(tables, state[1], state[0])))
+
+        self.search(root, state, tables, time_left)
+
+        if not root.children:
+            return legal_moves[0]
+        move = max(root.children.values(), key=lambda child: child.visits).move
+        self.root, self._root_state, self._last_move = root, state, move
+        return (move // game.width, move % game.width)
+
+    def _reuse(self, state):
+        """Return the subtree of the previous search for `state` if it
+        follows from the previous root by our move and one opponent reply,
+        or None.
+        """
+        if self.root is None:
+            return None
+        blank, to_move, opponent = self._root_state
+        move = self._last_move
+        new_blank, new_to_move, new_opponent = state
+        if new_to_move != move or new_opponent is None or \
+                new_blank != blank ^ (1 << move) ^ (1 << new_opponent):
+            return None
+        child = self.root.children.get(move)
+        return child.children.get(new_opponent) if child is not None else None
+
+    def search(self, root, state, tables, time_left):
+        """Run playouts from `root`, whose state is `state`, until
+        `time_left()` falls below the timeout threshold.
+        """
+        while time_left() > self.TIMER_THRESHOLD:
+            self.playout(root, state, tables)
+            self.nodes_searched += 1
+
+    def playout(self, root, state, tables):
+        """Run one iteration of selection, expansion, simulation and
+        backpropagation from `root`, whose state is `state`.
+        """
+        path, (blank, to_move, opponent) = self.descend(root, state, tables)
+
+        # Simulation, scored for the player who moved into the leaf
+        won = rollout(tables, blank, to_move, opponent, self.rng, self.greedy)
+        self.backpropagate(path, 0. if won else 1.)
+
+    def descend(self, root, state, tables, virtual_loss=0):
+        """Select a path from `root` by UCT and expand one untried move.
+
+        With `virtual_loss`, every node on the path is charged that many
+        lost visits until `backpropagate` is called, steering the selection
+        of other pending playouts elsewhere.
+
+        Returns
+        ----------
+        (list<MCTSNode>, (int, int, int))
+            The nodes from the root to the new leaf, and the leaf's state.
+        """
+        rng = self.rng
+        blank, to_move, opponent = state
+        node = root
+        path = [root]
+
+        # Selection: descend through fully expanded nodes by UCT
+        while not node.untried and node.children:
+            node.visits += virtual_loss
+            node = self.select(node)
+            path.append(node)
+            blank ^= 1 << node.move
+            to_move, opponent = opponent, node.move
+
+        # Expansion: add one untried move
+        if node.untried:
+            untried = node.untried
+            move = untried.pop(rng.randrange(len(untried)))
+            blank ^= 1 << move
+            to_move, opponent = opponent, move
+            child = MCTSNode(move, cells(legal_mask(tables, to_move, blank)))
+            node.children[move] = child
+            node.visits += virtual_loss
+            path.append(child)
+        path[-1].visits += virtual_loss
+        return path, (blank, to_move, opponent)
+
+    def backpropagate(self, path, result, virtual_loss=0):
+        """Add a playout `result` (1. if the player who moved into the last
+        node of `path` won) to the nodes of `path`, alternating the
+        perspective at each level, and remove any virtual loss.
+        """
+        for node in reversed(path):
+            node.visits += 1 - virtual_loss
+            node.wins += result
+            result = 1. - result
+
+    def select(self, node):
+        """Return the child of `node` maximizing the UCT score."""
+        scale = self.exploration * math.sqrt(math.log(node.visits))
+        best, best_score = None, float("-inf")
+        for child in node.children.values():
+            score = child.wins / child.visits + scale / math.sqrt(child.visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+
+IPC_MARGIN = 5.  # ms reserved for collecting the results from the workers
+LEAF_BATCH = 8   # playouts per worker per round in tree parallel mode
+
+_worker_rng = random.Random()
+
+
+def _init_worker(seed):
+    """Seed each worker process differently."""
+    _worker_rng.seed(None if seed is None else "{}/{}".format(seed, os.getpid()))
+
+
+def _root_search(args):
+    """Build an independent tree from `state` in a worker until `deadline`
+    and return the visit counts of the root moves and the playouts run.
+
+    The deadline is a `time.monotonic()` reading taken in the main process,
+    which is comparable across processes on the same machine, so a task
+    that starts late (or is picked up by another worker) still stops on
+    time.
+    """
+    state, width, height, exploration, greedy, deadline = args
+    player = MCTSPlayer(exploration, 0., reuse_tree=False)
+    player.greedy = greedy
+    player.rng = _worker_rng
+    tables = knight_tables(width, height)
+    root = MCTSNode(None, cells(legal_mask(tables, state[1], state[0])))
+    player.search(root, state, tables, lambda: 1000. * (deadline - time.monotonic()))
+    return dict((move, child.visits) for move, child in root.children.items()), \
+        player.nodes_searched
+
+
+def _simulate(args):
+    """Run a playout from each of a list of leaf states in a worker and
+    return whether the player to move in each state won."""
+    states, width, height, greedy = args
+    tables = knight_tables(width, height)
+    return [rollout(tables, blank, to_move, opponent, _worker_rng, greedy)
+            for blank, to_move, opponent in states]
+
+
+class ParallelMCTSPlayer(MCTSPlayer):
+    """Monte Carlo Tree Search player running its playouts on a pool of
+    worker processes that persists across moves and games. Call `close()`
+    to shut the pool down.
+
+    Parameters
+    ----------
+    processes : int (optional)
+        Number of worker processes; defaults to the number of CPUs.
+
+    mode : {'root', 'tree'} (optional)
+        With 'root', every worker builds its own tree from the current
+        position until the deadline and the root visit counts are summed.
+        With 'tree', the main process keeps one tree (reused between turns)
+        and repeatedly selects a batch of leaves, charging a virtual loss to
+        each selected path so that the batch spreads over different lines,
+        and the workers simulate the leaves.
+
+    virtual_loss : int (optional)
+        Number of lost visits charged to a pending path in 'tree' mode; at
+        least 1, since UCT can't score the unvisited leaves of a batch
+        otherwise.
+
+    Other parameters are the same as for `MCTSPlayer`.
+    """
+
+    def __init__(self, processes=None, mode='root', virtual_loss=1,
+                 exploration=EXPLORATION, timeout=10., rollout_policy='random',
+                 reuse_tree=True, seed=None):
+        super(ParallelMCTSPlayer, self).__init__(exploration, timeout, rollout_policy,
+                                                 reuse_tree and mode == 'tree', seed)
+        if mode == 'tree' and virtual_loss < 1:
+            raise ValueError("virtual_loss must be at least 1 in tree mode")
+        self.processes = processes or os.cpu_count()
+        self.mode = mode
+        self.virtual_loss = virtual_loss
+        # start the workers now, since doing it during a move would overrun
+        # the time limit
+        self.pool = multiprocessing.Pool(self.processes, _init_worker, (seed,))
+
+    def close(self):
+        """Stop the worker processes."""
+        self.pool.terminate()
+        self.pool.join()
+
+    def get_move(self, game, legal_moves, time_left):
+        """Search for the best move using the worker pool; see
+        `MCTSPlayer.get_move`."""
+        if not legal_moves:
+            return (-1, -1)
+        if self.mode == 'tree':
+            return super(ParallelMCTSPlayer, self).get_move(game, legal_moves, time_left)
+
+        budget = time_left() - self.TIMER_THRESHOLD - IPC_MARGIN
+        if budget <= 0:
+            return legal_moves[0]
+        task = (board_state(game), game.width, game.height, self.exploration,
+                self.greedy, time.monotonic() + budget / 1000.)
+        visits = {}
+        try:
+            results = self.pool.map_async(_root_search, [task] * self.processes).get(
+                timeout=max(time_left() - self.TIMER_THRESHOLD, 0.) / 1000.)
+        except multiprocessing.TimeoutError:
+            return legal_moves[0]
+        for counts, playouts in results:
+            self.nodes_searched += playouts
+            for move, count in counts.items():
+                visits[move] = visits.get(move, 0) + count
+        if not visits:
+            return legal_moves[0]
+        move = max(visits, key=visits.get)
+        return (move // game.width, move % game.width)
+
+    def search(self, root, state, tables, time_left):
+        """Expand the shared tree in rounds until the deadline: select a
+        batch of leaves under virtual loss, simulate them on the workers and
+        back up the results.
+        """
+        batch = LEAF_BATCH * self.processes
+        chunk = LEAF_BATCH
+        width, height = tables.width, tables.height
+        while time_left() > self.TIMER_THRESHOLD + IPC_MARGIN:
+            pending = [self.descend(root, state, tables, self.virtual_loss)
+                       for _ in range(batch)]
+            leaves = [leaf for _, leaf in pending]
+            tasks = [(leaves[i:i + chunk], width, height, self.greedy)
+                     for i in range(0, len(leaves), chunk)]
+            try:
+                results = self.pool.map_async(_simulate, tasks).get(
+                    timeout=max(time_left() - self.TIMER_THRESHOLD, 0.) / 1000.)
+            except multiprocessing.TimeoutError:
+                self._rollback(pending)
+                break
+            outcomes = [won for result in results for won in result]
+            for (path, _), won in zip(pending, outcomes):
+                self.backpropagate(path, 0. if won else 1., self.virtual_loss)
+            self.nodes_searched += len(outcomes)
+
+    def _rollback(self, pending):
+        """Undo the selection of a round whose playouts didn't finish: drop
+        the virtual losses, and detach the leaves expanded for the round
+        (which are left unvisited) so that the tree kept for the next turn
+        has no nodes that UCT can't score.
+        """
+        for path, _ in pending:
+            for node in path:
+                node.visits -= self.virtual_loss
+        for path, _ in reversed(pending):
+            leaf = path[-1]
+            if len(path) > 1 and leaf.visits == 0:
+                parent = path[-2]
+                if parent.children.get(leaf.move) is leaf:
+                    del parent.children[leaf.move]
+                    parent.untried.append(leaf.move)
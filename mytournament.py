@@ -27,6 +27,7 @@ import pickle
 from collections import namedtuple
 
 from isolation import Board
+from isolation import encode_move
 from sample_players import RandomPlayer
 from sample_players import null_score
 from sample_players import open_move_score
@@ -74,6 +75,7 @@ def play_match(player1, player2):
 
     # play both games and tally the results
 
+    # opening book keys are the three opening moves encoded as cell indices
     opening_book = {}
     for move1, move2 in first_two_moves:
         print("Iteration {} of {}".format((move1, move2), len(first_two_moves)))
@@ -82,10 +84,11 @@ def play_match(player1, player2):
         game.apply_move(move2)
 
         for move3 in game.get_legal_moves():
+            opening = (encode_move(move1), encode_move(move2), encode_move(move3))
             game.apply_move(move3)
             winner, _, termination = game.play(time_limit=TIME_LIMIT)
             if player1 == winner:
-                opening_book[(move1, move2, move3)] = 1
+                opening_book[opening] = 1
                 num_wins[player1] += 1
 
                 if termination == "timeout":
@@ -94,7 +97,7 @@ def play_match(player1, player2):
                     num_invalid_moves[player2] += 1
 
             elif player2 == winner:
-                opening_book[(move1, move2, move3)] = 0
+                opening_book[opening] = 0
                 num_wins[player2] += 1
 
                 if termination == "timeout":
@@ -0,0 +1,159 @@
+"""
+Count the leaf nodes of the full game tree to a fixed depth ("perft", after
+the chess engine tool of the same name), to measure the raw move generation
+speed of a board implementation and to check a new implementation against
+the reference `isolation.Board`.
+
+A leaf is a position reached after exactly `depth` plies; lines that end in
+a loss before that contribute nothing. Two options speed up the count
+without changing it:
+
+    --bulk   count the legal moves at the last ply instead of making them
+    --cache  reuse the counts of transposed positions (same blocked cells and
+             player locations reached by a different move order)
+
+Examples:
+
+    python perft.py --depth 4
+    python perft.py --depth 5 --size 5 --board CompactBoard --bulk --cache
+    python perft.py --depth 3 --moves 3,3 2,1 --divide
+"""
+
+import argparse
+import random
+import timeit
+
+from isolation import Board
+from isolation import MobilityBoard
+from isolation import CompactBoard
+
+BOARD_CLASSES = {"Board": Board, "MobilityBoard": MobilityBoard,
+                 "CompactBoard": CompactBoard}
+
+
+def perft(game, depth, bulk=False, cache=None):
+    """Count the positions reached after `depth` plies from `game`.
+
+    Parameters
+    ----------
+    game : `isolation.Board`
+        The root position; it is not modified.
+
+    depth : int
+        Number of plies to search.
+
+    bulk : bool (optional)
+        If True, positions one ply above the leaves report their number of
+        legal moves instead of generating each child.
+
+    cache : dict (optional)
+        If given, counts are stored in (and read from) this dict, keyed on
+        the position key and the remaining depth.
+
+    Returns
+    ----------
+    int
+        The number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+    if bulk and depth == 1:
+        return game.mobility()
+    if cache is not None:
+        key = (game.position_key(), depth)
+        if key in cache:
+            return cache[key]
+    nodes = 0
+    for move in game.get_legal_moves():
+        nodes += perft(game.forecast_move(move), depth - 1, bulk, cache)
+    if cache is not None:
+        cache[key] = nodes
+    return nodes
+
+
+def divide(game, depth, bulk=False, cache=None):
+    """Return a list of (move, nodes) pairs with the perft count below each
+    legal move of the root, to locate the first move where two board
+    implementations disagree."""
+    return [(move, perft(game.forecast_move(move), depth - 1, bulk, cache))
+            for move in game.get_legal_moves()]
+
+
+def parse_move(text):
+    """Parse a move given as "row,col"."""
+    row, col = text.split(",")
+    return int(row), int(col)
+
+
+def random_position(board_class, width, height, plies, rng):
+    """Play `plies` random legal moves from the empty board."""
+    game = board_class("player1", "player2", width=width, height=height)
+    for _ in range(plies):
+        moves = game.get_legal_moves()
+        if not moves:
+            break
+        game.apply_move(rng.choice(moves))
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--size", type=int, nargs=2, default=(7, 7),
+                        metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--board", choices=sorted(BOARD_CLASSES), default="Board",
+                        help="board implementation to enumerate with")
+    parser.add_argument("--moves", nargs="*", default=[], metavar="ROW,COL",
+                        help="moves to apply to the empty board before counting")
+    parser.add_argument("--random", type=int, default=0, metavar="N",
+                        help="count from N random positions instead")
+    parser.add_argument("--plies", type=int, default=4,
+                        help="number of random moves played in each random position")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bulk", action="store_true",
+                        help="count the moves at the last ply instead of making them")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse the counts of transposed positions")
+    parser.add_argument("--divide", action="store_true",
+                        help="print the count below each root move")
+    args = parser.parse_args()
+
+    board_class = BOARD_CLASSES[args.board]
+    width, height = args.size
+    if args.random:
+        rng = random.Random(args.seed)
+        positions = [random_position(board_class, width, height, args.plies, rng)
+                     for _ in range(args.random)]
+    else:
+        game = board_class("player1", "player2", width=width, height=height)
+        for move in args.moves:
+            game.apply_move(parse_move(move))
+        positions = [game]
+
+    total_nodes, total_time = 0, 0.
+    for game in positions:
+        cache = {} if args.cache else None
+        start = timeit.default_timer()
+        if args.divide:
+            counts = divide(game, args.depth, args.bulk, cache)
+            nodes = sum(n for _, n in counts)
+        else:
+            nodes = perft(game, args.depth, args.bulk, cache)
+        elapsed = timeit.default_timer() - start
+        total_nodes += nodes
+        total_time += elapsed
+
+        print(game.to_string())
+        if args.divide:
+            for move, n in counts:
+                print("  {:<10}{:>14}".format("{},{}".format(*move), n))
+        print("perft({}) = {}   {:.3f}s   {:,.0f} nodes/s\n".format(
+            args.depth, nodes, elapsed, nodes / elapsed if elapsed else 0.))
+
+    if len(positions) > 1:
+        print("total {} nodes in {:.3f}s   {:,.0f} nodes/s".format(
+            total_nodes, total_time, total_nodes / total_time if total_time else 0.))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,33 @@ own agent and example heuristic functions.
 
 from random import randint
 
+from isolation.vectorized import vectorized
+from isolation.vectorized import batch_mobility
+from isolation.vectorized import own_and_opponent
+from isolation.vectorized import with_terminal_scores
 
+
+def null_score_batch(game, moves, player):
+    """Batched `null_score` for the positions after each of `moves`."""
+    mover, other = batch_mobility(game, moves)
+    return with_terminal_scores(0 * other, game, player, other)
+
+
+def open_move_score_batch(game, moves, player):
+    """Batched `open_move_score` for the positions after each of `moves`."""
+    mover, other = batch_mobility(game, moves)
+    own, _ = own_and_opponent(game, player, mover, other)
+    return with_terminal_scores(own, game, player, other)
+
+
+def improved_score_batch(game, moves, player):
+    """Batched `improved_score` for the positions after each of `moves`."""
+    mover, other = batch_mobility(game, moves)
+    own, opp = own_and_opponent(game, player, mover, other)
+    return with_terminal_scores(own - opp, game, player, other)
+
+
+@vectorized(null_score_batch)
 def null_score(game, player):
     """This heuristic presumes no knowledge for non-terminal states, and
     returns the same uninformative value for all other states.
@@ -35,6 +61,7 @@ def null_score(game, player):
     return 0.
 
 
+@vectorized(open_move_score_batch)
 def open_move_score(game, player):
     """The basic evaluation function described in lecture that outputs a score
     equal to the number of moves open for your computer player on the board.
@@ -61,9 +88,10 @@ def open_move_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    return float(len(game.get_legal_moves(player)))
+    return float(game.mobility(player))
 
 
+@vectorized(improved_score_batch)
 def improved_score(game, player):
     """The "Improved" evaluation function discussed in lecture that outputs a
     score equal to the difference in the number of moves available to the
@@ -91,8 +119,8 @@ def improved_score(game, player):
     if game.is_winner(player):
         return float("inf")
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
+    own_moves = game.mobility(player)
+    opp_moves = game.mobility(game.get_opponent(player))
     return float(own_moves - opp_moves)
 
 
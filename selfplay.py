@@ -0,0 +1,60 @@
+"""
+Generate self-play games with the lockstep batched engine
+(`isolation.batch`), which advances every game of a batch one ply at a time
+with NumPy array operations, and report the throughput and results.
+
+    python selfplay.py --games 10000
+    python selfplay.py --games 200 --player1 rollout --player2 greedy
+    python selfplay.py --games 100000 --output games.npz
+
+The output file holds the `history` (cells moved to at each ply, row-major,
+-1 after the last ply) and `winner` (0 or 1) arrays of the games.
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from isolation.batch import BatchBoard
+from isolation.batch import greedy_policy
+from isolation.batch import random_policy
+from isolation.batch import rollout_policy
+from isolation.batch import two_ply_policy
+
+POLICIES = {"random": lambda args: random_policy,
+            "greedy": lambda args: greedy_policy(),
+            "two-ply": lambda args: two_ply_policy(),
+            "rollout": lambda args: rollout_policy(args.playouts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--size", type=int, nargs=2, default=(7, 7),
+                        metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--player1", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--player2", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--playouts", type=int, default=16,
+                        help="playouts per move of the rollout policy")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="save the games to this .npz file")
+    args = parser.parse_args()
+
+    width, height = args.size
+    batch = BatchBoard(args.games, width, height)
+    start = timeit.default_timer()
+    winner = batch.play(POLICIES[args.player1](args), POLICIES[args.player2](args), args.seed)
+    elapsed = timeit.default_timer() - start
+
+    plies = batch.move_count.sum()
+    print("{} games, {} plies in {:.2f}s  ({:,.0f} games/s, {:,.0f} plies/s)".format(
+        args.games, plies, elapsed, args.games / elapsed, plies / elapsed))
+    print("player 1 ({}) won {:.1%}, average length {:.1f} plies".format(
+        args.player1, (winner == 0).mean(), batch.move_count.mean()))
+    if args.output:
+        np.savez_compressed(args.output, history=batch.history, winner=winner)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Solve Isolation on small boards: prove whether the player to move wins with
+perfect play, and record the results for the opening positions in a table
+that `game_agent.CustomPlayer` can consult (see its `opening_table`
+parameter).
+
+The solver is a win/loss-only negamax over bitmask positions (see
+`isolation.bitboard`). Its transposition table is keyed on the canonical
+image of each position under the board symmetries (`isolation.symmetry`), so
+each class of symmetric positions is solved once. Moves that leave the
+opponent the fewest replies are tried first, which finds refutations
+quickly.
+
+    python solver.py
+    python solver.py --size 6 5 --plies 2 --output solved_openings.pkl
+"""
+
+import argparse
+import pickle
+import timeit
+
+from isolation import Board
+from isolation.bitboard import knight_tables
+from isolation.bitboard import popcount
+from isolation.bitboard import cells
+from isolation.symmetry import symmetries
+from isolation.symmetry import bit_key
+
+OPENING_PLIES = 4    # default number of plies of openings to tabulate
+
+
+class Solver(object):
+    """
+    Game-theoretic solver for knight-move Isolation on a board of the given
+    size.
+
+    Attributes
+    ----------
+    tt : dict
+        Maps canonical (blocked mask, cell of the player to move, cell of the
+        other player) keys to True if the player to move wins.
+
+    nodes : int
+        Number of positions expanded (not found in `tt`).
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.tables = knight_tables(width, height)
+        self.symmetries = symmetries(width, height)
+        self.tt = {}
+        self.nodes = 0
+
+    def wins(self, blank, me, opp):
+        """
+        Return True if the player to move wins.
+
+        Parameters
+        ----------
+        blank : int
+            Mask of the blank cells.
+
+        me, opp : int
+            Cell of the player to move and of the other player (-1 if they
+            haven't moved yet).
+        """
+        attacks = self.tables.attacks
+        moves = blank if me < 0 else attacks[me] & blank
+        if not moves:
+            return False
+
+        key = self.symmetries.canonical(self.tables.full & ~blank, me, opp)
+        result = self.tt.get(key)
+        if result is not None:
+            return result
+        self.nodes += 1
+
+        # fail-first ordering: count the replies left to the opponent
+        children = []
+        for cell in cells(moves):
+            rest = blank & ~(1 << cell)
+            replies = rest if opp < 0 else attacks[opp] & rest
+            if not replies:
+                self.tt[key] = True
+                return True
+            children.append((popcount(replies), cell, rest))
+        children.sort()
+
+        result = False
+        for _, cell, rest in children:
+            if not self.wins(rest, opp, cell):
+                result = True
+                break
+        self.tt[key] = result
+        return result
+
+    def _state(self, game):
+        """Return (blank, me, opp) for the position of an `isolation.Board`."""
+        blocked, p1, p2 = bit_key(game)
+        me, opp = (p1, p2) if game.move_count % 2 == 0 else (p2, p1)
+        return self.tables.full & ~blocked, me, opp
+
+    def solve(self, game):
+        """Return True if the player to move in `game` wins."""
+        return self.wins(*self._state(game))
+
+    def winning_moves(self, game):
+        """Return the legal moves of `game` that keep a forced win."""
+        return [move for move in game.get_legal_moves()
+                if not self.solve(game.forecast_move(move))]
+
+
+def openings(width, height, plies):
+    """
+    Enumerate the positions reached after up to `plies` plies from the empty
+    board, one representative per symmetry class.
+
+    Returns
+    ----------
+    list<`isolation.Board`>
+        The positions, shortest openings first.
+    """
+    sym = symmetries(width, height)
+    seen = set()
+    positions = []
+    frontier = [Board("player1", "player2", width=width, height=height)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for game in frontier:
+            key = sym.canonical(*bit_key(game))
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append(game)
+            if ply < plies:
+                next_frontier.extend(game.forecast_move(m) for m in game.get_legal_moves())
+        frontier = next_frontier
+    return positions
+
+
+def build_table(width, height, plies=OPENING_PLIES, verbose=False):
+    """
+    Solve every opening of up to `plies` plies.
+
+    Returns
+    ----------
+    dict
+        Maps the canonical bitmask key (`isolation.symmetry.canonical_key`)
+        of each opening to True if the player to move wins.
+    """
+    solver = Solver(width, height)
+    results = {}
+    sym = solver.symmetries
+    for game in openings(width, height, plies):
+        key = sym.canonical(*bit_key(game))
+        start = timeit.default_timer()
+        results[key] = solver.solve(game)
+        if verbose and game.move_count < 2:
+            print("{}player to move {}  ({:.1f}s, {} positions solved)".format(
+                game.to_string(), "wins" if results[key] else "loses",
+                timeit.default_timer() - start, len(solver.tt)))
+    return results
+
+
+def load_table(path):
+    """Load a solved-openings file written by `save_table` (or this script),
+    in the form expected by `CustomPlayer(opening_table=...)`: a dict
+    mapping (width, height) to the results of `build_table`."""
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_table(path, tables):
+    """Write a dict mapping (width, height) to `build_table` results."""
+    with open(path, "wb") as f:
+        pickle.dump(tables, f, pickle.HIGHEST_PROTOCOL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, nargs=2, action="append",
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="board size to solve (repeatable; default 4x4 and 5x5)")
+    parser.add_argument("--plies", type=int, default=OPENING_PLIES,
+                        help="tabulate openings of up to this many plies")
+    parser.add_argument("--output", default="solved_openings.pkl",
+                        help="file to write (sizes already in it are kept)")
+    args = parser.parse_args()
+
+    try:
+        tables = load_table(args.output)
+    except (IOError, OSError):
+        tables = {}
+
+    for width, height in args.size or [(4, 4), (5, 5)]:
+        start = timeit.default_timer()
+        results = build_table(width, height, args.plies, verbose=True)
+        tables[(width, height)] = results
+        wins = sum(results.values())
+        print("{}x{}: {} openings solved ({} won by the player to move) in {:.1f}s\n".format(
+            width, height, len(results), wins, timeit.default_timer() - start))
+
+    save_table(args.output, tables)
+
+
+if __name__ == "__main__":
+    main()
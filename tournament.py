@@ -17,24 +17,38 @@ For example, if the random moves chosen for initialization are (5, 2) and
 agentB at (1, 3) as player 2 then play to conclusion; the agents swap
 initiative in the second match with agentB at (5, 2) as player 1 and agentA at
 (1, 3) as player 2.
+
+With --nodes-per-ms (or --calibrate), every turn is timed by a virtual clock
+that charges agents for the nodes they search instead of elapsed time (see
+`isolation.NodeClock`). Games are then independent of the machine load and,
+with --seed, exactly reproducible.
+
+With --move-cache PATH, the moves of the fixed-depth agents are kept in a
+database file shared by later runs (see `game_agent.MoveCache`), so their
+searches are only repeated for positions they haven't seen.
 """
 
+import argparse
 import itertools
 import random
+import timeit
 import warnings
 
 from collections import namedtuple
 
-from isolation import Board
+from isolation import MobilityBoard
+from isolation import NodeClock
 from sample_players import RandomPlayer
 from sample_players import null_score
 from sample_players import open_move_score
 from sample_players import improved_score
 from game_agent import CustomPlayer
 from game_agent import custom_score
+from game_agent import MoveCache
 
 NUM_MATCHES = 25  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
+CALIBRATION_MOVES = 20  # searches timed to calibrate the node clock
 
 TIMEOUT_WARNING = "One or more agents lost a match this round due to " + \
                   "timeout. The get_move() function must return before " + \
@@ -57,17 +71,18 @@ same opponents.
 Agent = namedtuple("Agent", ["player", "name"])
 
 
-def play_match(player1, player2):
+def play_match(player1, player2, clock=None):
     """
     Play a "fair" set of matches between two agents by playing two games
     between the players, forcing each agent to play from randomly selected
     positions. This should control for differences in outcome resulting from
-    advantage due to starting position on the board.
+    advantage due to starting position on the board. If a `NodeClock` is
+    given, the games are timed by it instead of the wall clock.
     """
     num_wins = {player1: 0, player2: 0}
     num_timeouts = {player1: 0, player2: 0}
     num_invalid_moves = {player1: 0, player2: 0}
-    games = [Board(player1, player2), Board(player2, player1)]
+    games = [MobilityBoard(player1, player2), MobilityBoard(player2, player1)]
 
     # initialize both games with a random move and response
     for _ in range(2):
@@ -77,7 +92,7 @@ def play_match(player1, player2):
 
     # play both games and tally the results
     for game in games:
-        winner, _, termination = game.play(time_limit=TIME_LIMIT)
+        winner, _, termination = game.play(time_limit=TIME_LIMIT, clock=clock)
 
         if player1 == winner:
             num_wins[player1] += 1
@@ -102,7 +117,7 @@ def play_match(player1, player2):
     return num_wins[player1], num_wins[player2]
 
 
-def play_round(agents, num_matches):
+def play_round(agents, num_matches, clock=None):
     """
     Play one round (i.e., a single match between each pair of opponents)
     """
@@ -122,7 +137,7 @@ def play_round(agents, num_matches):
         # Each player takes a turn going first
         for p1, p2 in itertools.permutations((agent_1.player, agent_2.player)):
             for _ in range(num_matches):
-                score_1, score_2 = play_match(p1, p2)
+                score_1, score_2 = play_match(p1, p2, clock)
                 counts[p1] += score_1
                 counts[p2] += score_2
                 total += score_1 + score_2
@@ -135,13 +150,61 @@ def play_round(agents, num_matches):
     return 100. * wins / total
 
 
+def calibrate(moves=CALIBRATION_MOVES, time_limit=TIME_LIMIT):
+    """
+    Measure the search speed of an iterative deepening agent on this machine,
+    in nodes per millisecond, by timing searches from random positions with
+    the wall clock.
+    """
+    rng = random.Random(0)
+    agent = CustomPlayer(score_fn=improved_score, method='alphabeta', iterative=True)
+    nodes, elapsed = 0, 0.
+    for _ in range(moves):
+        game = MobilityBoard(agent, "opponent")
+        for _ in range(2 * rng.randint(1, 10)):
+            legal_moves = game.get_legal_moves()
+            if not legal_moves:
+                break
+            game.apply_move(rng.choice(legal_moves))
+        if game.active_player != agent or not game.get_legal_moves():
+            continue
+        start_nodes = agent.nodes_searched
+        start = 1000 * timeit.default_timer()
+        agent.get_move(game, game.get_legal_moves(),
+                       lambda: time_limit - (1000 * timeit.default_timer() - start))
+        nodes += agent.nodes_searched - start_nodes
+        elapsed += 1000 * timeit.default_timer() - start
+    return nodes / elapsed if elapsed else 1.
+
+
 def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--nodes-per-ms", type=float, default=None,
+                        help="time turns by a virtual clock charging agents "
+                             "for this many search nodes per millisecond")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="measure --nodes-per-ms on this machine first")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the random opening moves")
+    parser.add_argument("--move-cache", default=None, metavar="PATH",
+                        help="cache the moves of the fixed-depth agents in this file")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    nodes_per_ms = calibrate() if args.calibrate else args.nodes_per_ms
+    clock = None
+    if nodes_per_ms:
+        print("Timing turns by a node clock at {:.1f} nodes/ms".format(nodes_per_ms))
+        clock = NodeClock(nodes_per_ms)
 
     HEURISTICS = [("Null", null_score),
                   ("Open", open_move_score),
                   ("Improved", improved_score)]
     AB_ARGS = {"search_depth": 5, "method": 'alphabeta', "iterative": False}
     MM_ARGS = {"search_depth": 3, "method": 'minimax', "iterative": False}
+    if args.move_cache:
+        AB_ARGS["move_cache"] = MM_ARGS["move_cache"] = MoveCache(args.move_cache)
     CUSTOM_ARGS = {"method": 'alphabeta', 'iterative': True}
 
     # Create a collection of CPU agents using fixed-depth minimax or alpha beta
@@ -171,7 +234,7 @@ def main():
         print("*************************")
 
         agents = random_agents + mm_agents + ab_agents + [agentUT]
-        win_ratio = play_round(agents, NUM_MATCHES)
+        win_ratio = play_round(agents, NUM_MATCHES, clock)
 
         print("\n\nResults:")
         print("----------")
@@ -0,0 +1,203 @@
+"""
+Tune the weights of `game_agent.WeightedMobilityScore` (the parameterized
+form of custom_score) by self-play, using simultaneous perturbation
+stochastic approximation (SPSA).
+
+Each iteration perturbs all the weights at once in a random direction,
+plays a batch of matches between an agent using the weights shifted one way
+and an agent using the weights shifted the other way, and moves the weights
+along the direction that won more games. The matches of an iteration are
+played in parallel on a process pool. Both agents play each opening once
+with each color, so the results are not biased by the starting position or
+initiative.
+
+The state (including that of the random number generator) is checkpointed
+to a JSON file after every iteration, and an interrupted run can be resumed
+with --resume, playing the same games an uninterrupted run would have:
+
+    python tune.py --iterations 200 --games 32 --checkpoint tune.json
+    python tune.py --iterations 400 --checkpoint tune.json --resume
+
+With --time-limit, the agents run iterative deepening. Adding --nodes-per-ms
+times their turns by a node clock (`isolation.NodeClock`) instead of the wall
+clock, so results don't depend on how many processes share the machine.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+
+from isolation import MobilityBoard
+from isolation import NodeClock
+from game_agent import CustomPlayer
+from game_agent import WeightedMobilityScore
+
+PARAMETERS = ["own_weight", "endgame_own_weight", "endgame_move"]
+INITIAL = [1.3, 0.75, 25.]     # the hand-picked weights of custom_score
+SCALE = [0.5, 0.5, 10.]        # typical magnitude of a useful change
+BOUNDS = [(0., 5.), (0., 5.), (0., 60.)]
+
+# SPSA gain sequences: a_k = A / (k + 1 + STABILITY)^ALPHA and
+# c_k = C / (k + 1)^GAMMA, in units of SCALE
+A = 0.5
+C = 0.3
+STABILITY = 10
+ALPHA = 0.602
+GAMMA = 0.101
+
+
+def make_player(theta, depth, time_limit):
+    """Create an agent using the given weights."""
+    score_fn = WeightedMobilityScore(*theta)
+    if time_limit:
+        return CustomPlayer(score_fn=score_fn, method='alphabeta', iterative=True)
+    return CustomPlayer(search_depth=depth, score_fn=score_fn,
+                        method='alphabeta', iterative=False)
+
+
+def play_pair(args):
+    """Play an opening twice between agents using weights `theta_a` and
+    `theta_b`, switching colors between the games. Returns the number of
+    games won by agent A.
+
+    This runs in a worker process, so it takes a single tuple of arguments.
+    """
+    theta_a, theta_b, opening, width, height, depth, time_limit, nodes_per_ms = args
+    clock = NodeClock(nodes_per_ms) if nodes_per_ms else None
+    wins = 0
+    for a_first in (True, False):
+        player_a = make_player(theta_a, depth, time_limit)
+        player_b = make_player(theta_b, depth, time_limit)
+        players = (player_a, player_b) if a_first else (player_b, player_a)
+        game = MobilityBoard(players[0], players[1], width, height)
+        for move in opening:
+            game.apply_move(move)
+        winner, _, _ = game.play(time_limit=time_limit or float("inf"), clock=clock)
+        wins += winner is player_a
+    return wins
+
+
+def random_opening(rng, width, height, plies=2):
+    """Choose the first `plies` moves of a game at random."""
+    game = MobilityBoard("p1", "p2", width, height)
+    opening = []
+    for _ in range(plies):
+        move = rng.choice(game.get_legal_moves())
+        game.apply_move(move)
+        opening.append(move)
+    return opening
+
+
+def clip(theta):
+    """Keep the weights within BOUNDS."""
+    return [min(max(t, lo), hi) for t, (lo, hi) in zip(theta, BOUNDS)]
+
+
+def spsa_step(state, pool, args, rng):
+    """Run one SPSA iteration and update `state` in place."""
+    k = state["iteration"]
+    a_k = A / (k + 1 + STABILITY) ** ALPHA
+    c_k = C / (k + 1) ** GAMMA
+    theta = state["theta"]
+    delta = [rng.choice((-1, 1)) for _ in theta]
+    theta_plus = clip([t + c_k * d * s for t, d, s in zip(theta, delta, SCALE)])
+    theta_minus = clip([t - c_k * d * s for t, d, s in zip(theta, delta, SCALE)])
+
+    pairs = max(1, args.games // 2)
+    tasks = [(theta_plus, theta_minus, random_opening(rng, args.width, args.height),
+              args.width, args.height, args.depth, args.time_limit, args.nodes_per_ms)
+             for _ in range(pairs)]
+    wins_plus = sum(pool.map(play_pair, tasks))
+    games = 2 * pairs
+
+    # score difference in [-1, 1] between the two perturbations
+    result = (2. * wins_plus - games) / games
+    state["theta"] = clip([t + a_k * result / (2 * c_k * d) * s
+                           for t, d, s in zip(theta, delta, SCALE)])
+    state["iteration"] = k + 1
+    state["history"].append({"iteration": k + 1, "theta": state["theta"],
+                             "theta_plus": theta_plus, "theta_minus": theta_minus,
+                             "wins_plus": wins_plus, "games": games})
+
+
+def verify(theta, pool, args, rng, matches):
+    """Play `matches` pairs of games between the tuned and the initial
+    weights, and return the win ratio of the tuned weights.
+    """
+    tasks = [(theta, INITIAL, random_opening(rng, args.width, args.height),
+              args.width, args.height, args.depth, args.time_limit, args.nodes_per_ms)
+             for _ in range(matches)]
+    return sum(pool.map(play_pair, tasks)) / (2. * matches)
+
+
+def report(state):
+    """Print the tuned weights."""
+    print("\nTuned weights after {} iterations:".format(state["iteration"]))
+    for name, initial, value in zip(PARAMETERS, INITIAL, state["theta"]):
+        print("  {:<20}{:>8.3f}   (initial {:.3f})".format(name, value, initial))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=100,
+                        help="total number of SPSA iterations to reach")
+    parser.add_argument("--games", type=int, default=16,
+                        help="games played per iteration")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="fixed alpha-beta search depth of the agents")
+    parser.add_argument("--time-limit", type=int, default=0,
+                        help="use iterative deepening with this many ms per "
+                             "move instead of a fixed depth")
+    parser.add_argument("--nodes-per-ms", type=float, default=None,
+                        help="with --time-limit, time turns by a node clock at "
+                             "this search speed instead of the wall clock")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=7)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--checkpoint", default="tune_checkpoint.json")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the checkpoint file")
+    parser.add_argument("--verify", type=int, default=50,
+                        help="pairs of games against the initial weights to "
+                             "play at the end (0 to skip)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.resume and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as f:
+            state = json.load(f)
+        print("Resuming from iteration {}".format(state["iteration"]))
+    else:
+        state = {"iteration": 0, "theta": list(INITIAL), "history": []}
+
+    rng = random.Random(args.seed)
+    if "rng_state" in state:
+        # continue the sequence of perturbations and openings
+        version, internal, gauss_next = state["rng_state"]
+        rng.setstate((version, tuple(internal), gauss_next))
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        while state["iteration"] < args.iterations:
+            spsa_step(state, pool, args, rng)
+            last = state["history"][-1]
+            print("Iteration {:>4}: +{} / {} games  theta = {}".format(
+                state["iteration"], last["wins_plus"], last["games"],
+                ", ".join("{:.3f}".format(t) for t in state["theta"])))
+            state["rng_state"] = rng.getstate()
+            with open(args.checkpoint, "w") as f:
+                json.dump(state, f, indent=2)
+
+        report(state)
+        if args.verify:
+            ratio = verify(state["theta"], pool, args, rng, args.verify)
+            print("\nTuned vs initial weights: {:.1f}% of {} games won".format(
+                100 * ratio, 2 * args.verify))
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == "__main__":
+    main()